@@ -1,29 +1,68 @@
 import sys
 import os
+import math
+import time
+from collections import deque
 
 from PyQt5 import QtGui
-from PyQt5.QtGui import QIcon, QCursor, QPixmap
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QIcon, QCursor, QPixmap, QPainter
+from PyQt5.QtCore import Qt, QPoint, QRectF
 from PyQt5.QtWidgets import QApplication, QMainWindow, QAction, QFileDialog, QWidget, QLabel, QSlider, QSpinBox, QCheckBox, QPushButton
 import cv2.cv2 as cv2
 import numpy as np
 
 import QSS
+import BufferPool
+import Cache
+import Fields
 import Functions
+import History
+import ImageLoader
+import Operations
+import Proxy
+import Recipe
+import Saver
+import SaveQueue
+import Session
+import Tiling
+import Trace
+import PreviewScheduler
 
 loaded_image = np.empty(0)
+loaded_path = None
 manipulated_image = np.empty(0)
 preview_image = np.empty(0)
-image_history = []
+image_history = History.ImageHistory()
 image_history_index = -1
+image_version = 0
+open_started = 0.0
+first_paint_ms = 0.0
 
 main_window = None
 
 save_location = None
+save_options = dict(Saver.DEFAULT_SAVE_OPTIONS)
 
 SCREEN_MULTIPLIER = 0.45
 IMAGE_WIDTH, IMAGE_HEIGHT = 800, 800
 MENU_BAR_HEIGHT = 36
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+PROXY_PREVIEW = True
+NOISE_SEED_RANGE = 2 ** 31
+SEEDED_FUNCTIONS = (Functions.salt_and_pepper_noise, Functions.gaussian_noise, Functions.speckle_noise)
+PREVIEW_CACHE_BYTES = 512 * 1024 * 1024
+PREVIEW_POOL_BYTES = 256 * 1024 * 1024
+DISPLAY_CACHE_BYTES = 256 * 1024 * 1024
+PREVIEW_TILE_SIZE = 256
+PREVIEW_TILE_CACHE_BYTES = 64 * 1024 * 1024
+PREVIEW_ZOOM_STEP = 1.25
+PREVIEW_MAX_ZOOM = 8.0
+
+preview_pool = BufferPool.BufferPool(PREVIEW_POOL_BYTES)
+evicted_previews = deque()  # The cache evicts on the scheduler thread, but buffers only go back to the pool on the GUI thread
+preview_cache = Cache.ResultCache(PREVIEW_CACHE_BYTES, on_evict=evicted_previews.append)
+display_cache = Cache.ResultCache(DISPLAY_CACHE_BYTES, lambda pixmap: pixmap.width() * pixmap.height() * pixmap.depth() // 8)
 
 
 class CheckBox(QCheckBox):
@@ -135,10 +174,14 @@ class Field(QLabel):
             self.slider.setGeometry(0, self.height() // 2, self.width(), self.height() // 2)
 
     def updateAll(self, value):
-        self.spin_box.setValue(self.init_val)
-        self.spin_box.setDisabled(not value)
-        self.slider.setValue(self.init_val)
-        self.slider.setDisabled(not value)
+        if self.min_val == 0 and self.max_val == 1:
+            self.check_box.setChecked(self.init_val)
+            self.check_box.setDisabled(not value)
+        else:
+            self.spin_box.setValue(self.init_val)
+            self.spin_box.setDisabled(not value)
+            self.slider.setValue(self.init_val)
+            self.slider.setDisabled(not value)
 
     def drawPreviewImage(self):
         self.parent().drawPreviewImage()
@@ -148,34 +191,85 @@ class MovablePreview(QLabel):
     def __init__(self, image_data, parent=None):
         super().__init__(parent)
 
-        self.oldPos = self.pos()
-
-        self.image_data_rgb = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
-        self.image = QtGui.QImage(self.image_data_rgb, self.image_data_rgb.shape[1], self.image_data_rgb.shape[0], self.image_data_rgb.strides[0], QtGui.QImage.Format_RGB888)
+        self.oldPos = QPoint()
+        self.zoom = 1.0
+        self.offset_x, self.offset_y = 0.0, 0.0
+        self.image_version = 0
+        self.tile_cache = Cache.ResultCache(PREVIEW_TILE_CACHE_BYTES, lambda pixmap: pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+        self.tile_buffer = None
 
-        self.preview_image = QLabel(self)
-        self.preview_image.setGeometry(0, 0, self.image.width(), self.image.height())
-        self.drawPreviewImage()
+        self.changePreviewImage(image_data)
 
         self.setCursor(QCursor(Qt.OpenHandCursor))
 
+    @Trace.traced('MovablePreview.changePreviewImage')
     def changePreviewImage(self, image_data):
-        if image_data.shape[0] == 0 or image_data.shape[1] == 0:
-            self.image_data_rgb = image_data
-        else:
-            self.image_data_rgb = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
-        self.image = QtGui.QImage(self.image_data_rgb, self.image_data_rgb.shape[1], self.image_data_rgb.shape[0], self.image_data_rgb.strides[0], QtGui.QImage.Format_RGB888)
-        self.drawPreviewImage()
-
-    def drawPreviewImage(self):
-        self.preview_image.setGeometry(self.preview_image.x(), self.preview_image.y(), self.image.width(), self.image.height())
-        new_x, new_y = self.preview_image.x(), self.preview_image.y()
-        if self.image.width() > self.width():
-            new_x = clamp(self.preview_image.x(), -self.image.width() + self.width(), 0)
-        if self.image.height() > self.height():
-            new_y = clamp(self.preview_image.y(), -self.image.height() + self.height(), 0)
-        self.preview_image.move(new_x, new_y)
-        self.preview_image.setPixmap(QtGui.QPixmap.fromImage(self.image))
+        self.image_data = image_data
+        self.pyramid = [image_data]
+        self.image_version += 1
+        self.tile_cache.clear()
+        self.clampOffset()
+        self.update()
+
+    def pyramidLevel(self, level):
+        while len(self.pyramid) <= level and min(self.pyramid[-1].shape[:2]) > 1:
+            previous_level = self.pyramid[-1]
+            new_width, new_height = (previous_level.shape[1] + 1) // 2, (previous_level.shape[0] + 1) // 2
+            self.pyramid.append(cv2.resize(previous_level, (new_width, new_height), interpolation=cv2.INTER_AREA))
+        level = min(level, len(self.pyramid) - 1)
+        return level, self.pyramid[level]
+
+    def tilePixmap(self, level, level_image, tile_x, tile_y):
+        key = (self.image_version, level, tile_x, tile_y)
+        pixmap = self.tile_cache.get(key)
+        if pixmap is None:
+            tile = level_image[tile_y * PREVIEW_TILE_SIZE:(tile_y + 1) * PREVIEW_TILE_SIZE, tile_x * PREVIEW_TILE_SIZE:(tile_x + 1) * PREVIEW_TILE_SIZE]
+            if len(tile.shape) == 2:
+                tile = np.ascontiguousarray(tile)
+                with Trace.span('MovablePreview.tile.QImage'):
+                    image = QtGui.QImage(tile, tile.shape[1], tile.shape[0], tile.strides[0], QtGui.QImage.Format_Grayscale8)
+            else:
+                with Trace.span('MovablePreview.tile.cvtColor'):
+                    tile = self.tile_buffer = cv2.cvtColor(tile, cv2.COLOR_BGR2RGB, dst=self.tile_buffer)
+                with Trace.span('MovablePreview.tile.QImage'):
+                    image = QtGui.QImage(tile, tile.shape[1], tile.shape[0], tile.strides[0], QtGui.QImage.Format_RGB888)
+            with Trace.span('MovablePreview.tile.fromImage'):
+                pixmap = QtGui.QPixmap.fromImage(image)
+            self.tile_cache.put(key, pixmap)
+        return pixmap
+
+    def scaledSize(self):
+        return self.image_data.shape[1] * self.zoom, self.image_data.shape[0] * self.zoom
+
+    def clampOffset(self):
+        scaled_width, scaled_height = self.scaledSize()
+        self.offset_x = clamp(self.offset_x, 0, max(scaled_width - self.width(), 0))
+        self.offset_y = clamp(self.offset_y, 0, max(scaled_height - self.height(), 0))
+
+    @Trace.traced('MovablePreview.paintEvent')
+    def paintEvent(self, event):
+        if self.image_data.shape[0] == 0 or self.image_data.shape[1] == 0:
+            return
+        with Trace.span('MovablePreview.pyramidLevel'):
+            level, level_image = self.pyramidLevel(max(int(math.floor(math.log2(1 / self.zoom))), 0))
+        factor = self.zoom * self.image_data.shape[1] / level_image.shape[1]
+
+        first_x, first_y = int(self.offset_x / factor) // PREVIEW_TILE_SIZE, int(self.offset_y / factor) // PREVIEW_TILE_SIZE
+        last_x = min(int((self.offset_x + self.width()) / factor), level_image.shape[1] - 1) // PREVIEW_TILE_SIZE
+        last_y = min(int((self.offset_y + self.height()) / factor), level_image.shape[0] - 1) // PREVIEW_TILE_SIZE
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.zoom < 1.0)
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                pixmap = self.tilePixmap(level, level_image, tile_x, tile_y)
+                target = QRectF(tile_x * PREVIEW_TILE_SIZE * factor - self.offset_x, tile_y * PREVIEW_TILE_SIZE * factor - self.offset_y,
+                                pixmap.width() * factor, pixmap.height() * factor)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.clampOffset()
 
     def mousePressEvent(self, event):
         self.oldPos = event.globalPos()
@@ -183,17 +277,28 @@ class MovablePreview(QLabel):
 
     def mouseMoveEvent(self, event):
         delta = QPoint(event.globalPos() - self.oldPos)
-        new_x, new_y = self.preview_image.x(), self.preview_image.y()
-        if self.image.width() > self.width():
-            new_x = clamp(self.preview_image.x() + delta.x(), -self.image.width() + self.width(), 0)
-        if self.image.height() > self.height():
-            new_y = clamp(self.preview_image.y() + delta.y(), -self.image.height() + self.height(), 0)
-        self.preview_image.move(new_x, new_y)
+        self.offset_x -= delta.x()
+        self.offset_y -= delta.y()
+        self.clampOffset()
         self.oldPos = event.globalPos()
+        self.update()
 
     def mouseReleaseEvent(self, event):
         self.setCursor(QCursor(Qt.OpenHandCursor))
 
+    def wheelEvent(self, event):
+        if self.image_data.shape[0] == 0 or self.image_data.shape[1] == 0:
+            return
+        min_zoom = min(1.0, self.width() / self.image_data.shape[1], self.height() / self.image_data.shape[0])
+        new_zoom = self.zoom * PREVIEW_ZOOM_STEP if event.angleDelta().y() > 0 else self.zoom / PREVIEW_ZOOM_STEP
+        new_zoom = clamp(new_zoom, min_zoom, PREVIEW_MAX_ZOOM)
+        position = event.pos()
+        self.offset_x = (self.offset_x + position.x()) * new_zoom / self.zoom - position.x()
+        self.offset_y = (self.offset_y + position.y()) * new_zoom / self.zoom - position.y()
+        self.zoom = new_zoom
+        self.clampOffset()
+        self.update()
+
 
 class NewWindow(QWidget):
     def __init__(self, title, function, image_data, basic_fields=None, advanced_fields=None):
@@ -204,6 +309,9 @@ class NewWindow(QWidget):
         super().__init__()
 
         self.function = function
+        self.seed = None
+        if function in SEEDED_FUNCTIONS:  # Drawn once per dialog and recorded with the step, so the preview is exactly what Apply adds
+            self.seed = int(np.random.default_rng().integers(NOISE_SEED_RANGE))
         self.basic_fields = []
         self.advanced_fields = []
 
@@ -211,8 +319,20 @@ class NewWindow(QWidget):
         self.setFixedSize(IMAGE_WIDTH, self.height() // 20 + 3 * IMAGE_WIDTH // 20 * length + IMAGE_WIDTH // 8)
         self.setWindowTitle(title)
 
-        self.preview = MovablePreview(image_data, self)
-        self.preview.setGeometry(self.width() // 40, self.height() // 40, self.width() // 2, 3 * IMAGE_WIDTH // 20 * length + IMAGE_WIDTH // 40)
+        preview_width, preview_height = self.width() // 2, 3 * IMAGE_WIDTH // 20 * length + IMAGE_WIDTH // 40
+        self.source_image = image_data
+        self.proxy_image, self.proxy_scale = image_data, 1.0
+        if PROXY_PREVIEW:
+            self.proxy_image, self.proxy_scale = Proxy.make_proxy(image_data, preview_width, preview_height)
+
+        self.preview = MovablePreview(self.proxy_image, self)
+        self.preview.setGeometry(self.width() // 40, self.height() // 40, preview_width, preview_height)
+
+        self.image_version = image_version
+        self.shown_generation = 0
+        self.output_layout = None
+        self.scheduler = PreviewScheduler.PreviewScheduler(preview_cache, preview_pool, self)
+        self.scheduler.preview_ready.connect(self.showPreviewImage)
 
         for field_ind, field in enumerate(basic_fields):
             field_name, init_val, min_val, max_val, step_size = field
@@ -250,27 +370,58 @@ class NewWindow(QWidget):
 
         self.drawPreviewImage()
 
-    def drawPreviewImage(self):
-        global preview_image
-
+    def getArgs(self):
         args = []
         for basic_field in self.basic_fields:
             args.append(basic_field.getValue())
         for advanced_field in self.advanced_fields:
             args.append(advanced_field.getValue())
-        new_image_data = self.function(manipulated_image, args)
+        if self.seed is not None:
+            args.append(self.seed)
+        return args
+
+    @Trace.traced('NewWindow.drawPreviewImage')
+    def drawPreviewImage(self):
+        args = Proxy.scale_args(self.function, self.getArgs(), self.proxy_scale)
+        cache_key = (self.function, tuple(args), self.image_version, self.proxy_scale)
+        with Trace.span('NewWindow.drawPreviewImage.cache'):
+            new_image_data = preview_cache.get(cache_key)
+        if new_image_data is not None:
+            self.showPreviewImage(self.scheduler.cancel(), new_image_data)
+        else:
+            release_evicted_previews()
+            out = preview_pool.acquire(*self.output_layout) if self.output_layout is not None else None
+            with Trace.span('NewWindow.drawPreviewImage.submit'):
+                self.scheduler.submit(self.function, self.proxy_image, args, cache_key, out)
+
+    @Trace.traced('NewWindow.showPreviewImage')
+    def showPreviewImage(self, generation, new_image_data):
+        global preview_image
+
+        if not self.scheduler.isLatest(generation):
+            self.scheduler.markStale()
+            return
         preview_image = new_image_data
+        self.shown_generation = generation
+        self.output_layout = (new_image_data.shape, new_image_data.dtype)
         self.preview.changePreviewImage(new_image_data)
+        release_evicted_previews()
 
+    @Trace.traced('NewWindow.pressedOK')
     def pressedOK(self):
         global manipulated_image, image_history, image_history_index
 
-        manipulated_image = preview_image
-        main_window.drawManipulatedImage(manipulated_image)
+        if self.proxy_scale < 1.0 or not self.scheduler.isLatest(self.shown_generation):
+            with Trace.span('NewWindow.pressedOK.compute', function=Operations.get_operation_name(self.function)):
+                manipulated_image = Tiling.run_parallel(self.function, self.source_image, self.getArgs())
+        else:
+            preview_pool.forget(id(preview_image))  # The history now owns this buffer, so the pool must never hand it out again
+            manipulated_image = preview_image
+        invalidate_preview_cache()
+        with Trace.span('NewWindow.pressedOK.history'):
+            push_history(manipulated_image, [(Operations.get_operation_name(self.function), self.getArgs())])
+        main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
         main_window.updateAllActions(True)
-        image_history_index += 1
-        image_history.insert(image_history_index, manipulated_image)
-        image_history = image_history[:image_history_index + 1]
         self.close()
 
     def pressedReset(self):
@@ -288,9 +439,43 @@ class NewWindow(QWidget):
             field.updateAll(value)
 
     def closeEvent(self, event):
+        self.scheduler.stop()
         self.pressedCancel()
 
 
+class SaveOptionsWindow(QWidget):
+    def __init__(self):
+        super().__init__()
+
+        self.fields = []
+        fields = Fields.save_fields(save_options)
+        self.setFixedSize(IMAGE_WIDTH // 2, self.height() // 20 + 3 * IMAGE_WIDTH // 20 * len(fields) + IMAGE_WIDTH // 8)
+        self.setWindowTitle('Save Options')
+
+        for field_ind, field in enumerate(fields):
+            field_name, init_val, min_val, max_val, step_size = field
+            new_field = Field(field_name, init_val, min_val, max_val, step_size, self)
+            self.fields.append(new_field)
+            new_field.setGeometry(self.width() // 20, self.height() // 40 + 3 * IMAGE_WIDTH // 20 * field_ind, 9 * self.width() // 10, IMAGE_WIDTH // 10)
+            new_field.drawElements()
+
+        self.apply_button = QPushButton('Apply', self)
+        self.apply_button.setGeometry(self.width() // 8, self.height() - IMAGE_WIDTH // 10, self.width() // 3, IMAGE_WIDTH // 20)
+        self.apply_button.pressed.connect(lambda: self.pressedOK())
+
+        self.cancel_button = QPushButton('Cancel', self)
+        self.cancel_button.setGeometry(13 * self.width() // 24, self.height() - IMAGE_WIDTH // 10, self.width() // 3, IMAGE_WIDTH // 20)
+        self.cancel_button.pressed.connect(lambda: self.close())
+
+    def drawPreviewImage(self):
+        pass
+
+    def pressedOK(self):
+        for option_field, field in zip(Fields.SAVE_OPTION_FIELDS, self.fields):
+            save_options[option_field[0]] = field.getValue()
+        self.close()
+
+
 class AboutWindow(QLabel):
     def __init__(self):
         super().__init__()
@@ -354,8 +539,20 @@ class MainWindow(QMainWindow):
         self.manipulated_image_frame.setGeometry(IMAGE_WIDTH, MENU_BAR_HEIGHT, IMAGE_WIDTH, IMAGE_HEIGHT)
         self.manipulated_image_frame.setAccessibleName('manipulated_image_frame')
 
+        self.status_text = QLabel(self)
+        self.status_text.setAccessibleName('status_text')
+
+        self.image_loader = ImageLoader.ImageLoader(self)
+        self.image_loader.image_loaded.connect(finish_open_file)
+
+        self.save_queue = SaveQueue.SaveQueue(self)
+        self.save_queue.save_started.connect(lambda path, pending: self.setStatus('Saving {}...{}'.format(os.path.basename(path), ' ({} queued)'.format(pending) if pending else '')))
+        self.save_queue.save_finished.connect(lambda path, seconds, size: self.setStatus('Saved {} in {:.0f} ms ({} KB)'.format(os.path.basename(path), seconds * 1000, size // 1024)))
+        self.save_queue.save_failed.connect(lambda path, error: self.setStatus('Could not save {}: {}'.format(os.path.basename(path), error)))
+
         self.window = None
         self.about_window = None
+        self.save_options_window = None
 
         self._createActions()
         self._createMenuBar()
@@ -383,6 +580,23 @@ class MainWindow(QMainWindow):
         self.save_as_action.setShortcut('Shift+Ctrl+S')
         self.save_as_action.triggered.connect(save_as_file_action)
         self.actions_dict['save_as_action'] = self.save_as_action
+        self.save_options_action = QAction('Save &Options...', self)
+        self.save_options_action.triggered.connect(lambda: self.createSaveOptionsWindow())
+        self.actions_dict['save_options_action'] = self.save_options_action
+        self.nonImageActions_dict['save_options_action'] = self.save_options_action
+        self.open_session_action = QAction('Open Sessio&n...', self)
+        self.open_session_action.triggered.connect(open_session_action)
+        self.actions_dict['open_session_action'] = self.open_session_action
+        self.nonImageActions_dict['open_session_action'] = self.open_session_action
+        self.save_session_action = QAction('Save Sess&ion...', self)
+        self.save_session_action.triggered.connect(save_session_action)
+        self.actions_dict['save_session_action'] = self.save_session_action
+        self.export_recipe_action = QAction('E&xport Recipe...', self)
+        self.export_recipe_action.triggered.connect(export_recipe_action)
+        self.actions_dict['export_recipe_action'] = self.export_recipe_action
+        self.apply_recipe_action = QAction('A&pply Recipe...', self)
+        self.apply_recipe_action.triggered.connect(apply_recipe_action)
+        self.actions_dict['apply_recipe_action'] = self.apply_recipe_action
         self.reset_action = QAction('&Reset', self)
         self.reset_action.setShortcut('Ctrl+R')
         self.reset_action.triggered.connect(reset_image_action)
@@ -406,17 +620,15 @@ class MainWindow(QMainWindow):
             'Box Blur',
             Functions.box_blur,
             manipulated_image,
-            [('Kernel Size X', 1, 1, 49, 1),
-             ('Kernel Size Y', 1, 1, 49, 1)]))
+            *Fields.fields_for(Functions.box_blur, manipulated_image)
+        ))
         self.actions_dict['box_blur_action'] = self.box_blur_action
         self.gaussian_blur_action = QAction('&Gaussian Blur...', self)
         self.gaussian_blur_action.triggered.connect(lambda: self.createNewWindow(
             'Gaussian Blur',
             Functions.gaussian_blur,
             manipulated_image,
-            [('Kernel Size X', 1, 1, 49, 2),
-             ('Kernel Size Y', 1, 1, 49, 2)],
-            [('Std Deviation', 0, 0, 100, 1)]
+            *Fields.fields_for(Functions.gaussian_blur, manipulated_image)
         ))
         self.actions_dict['gaussian_blur_action'] = self.gaussian_blur_action
         self.median_blur_action = QAction('&Median Blur...', self)
@@ -424,16 +636,15 @@ class MainWindow(QMainWindow):
             'Median Blur',
             Functions.median_blur,
             manipulated_image,
-            [('Kernel Size', 1, 1, 49, 2)]))
+            *Fields.fields_for(Functions.median_blur, manipulated_image)
+        ))
         self.actions_dict['median_blur_action'] = self.median_blur_action
         self.bilateral_blur_action = QAction('B&ilateral Blur...', self)
         self.bilateral_blur_action.triggered.connect(lambda: self.createNewWindow(
             'Bilateral Blur',
             Functions.bilateral_blur,
             manipulated_image,
-            [('Kernel Size', 1, 1, 19, 1)],
-            [('Sigma Color', 0, 0, 300, 5),
-             ('Sigma Space', 0, 0, 300, 5)]
+            *Fields.fields_for(Functions.bilateral_blur, manipulated_image)
         ))
         self.actions_dict['bilateral_blur_action'] = self.bilateral_blur_action
         self.remove_blur_action = QAction('&Remove Blur', self)
@@ -445,10 +656,7 @@ class MainWindow(QMainWindow):
             'Crop',
             Functions.crop_image,
             manipulated_image,
-            [('X1', 0, 0, manipulated_image.shape[1] - 2, 1),
-             ('X2', manipulated_image.shape[1], 2, manipulated_image.shape[1], 1),
-             ('Y1', 0, 0, manipulated_image.shape[0] - 2, 1),
-             ('Y2', manipulated_image.shape[0], 2, manipulated_image.shape[0], 1)]
+            *Fields.fields_for(Functions.crop_image, manipulated_image)
         ))
         self.actions_dict['crop_action'] = self.crop_action
         self.flip_action = QAction('&Flip...', self)
@@ -456,8 +664,7 @@ class MainWindow(QMainWindow):
             'Flip',
             Functions.flip_image,
             manipulated_image,
-            [('Flip Horizontal', False, 0, 1, 1),
-             ('Flip Vertical', False, 0, 1, 1)]
+            *Fields.fields_for(Functions.flip_image, manipulated_image)
         ))
         self.actions_dict['flip_action'] = self.flip_action
         self.mirror_action = QAction('&Mirror...', self)
@@ -465,8 +672,7 @@ class MainWindow(QMainWindow):
             'Mirror',
             Functions.mirror_image,
             manipulated_image,
-            [('Mirror Horizontal', False, 0, 1, 1),
-             ('Mirror Vertical', False, 0, 1, 1)]
+            *Fields.fields_for(Functions.mirror_image, manipulated_image)
         ))
         self.actions_dict['mirror_action'] = self.mirror_action
         self.rotate_action = QAction('&Rotate...', self)
@@ -474,9 +680,7 @@ class MainWindow(QMainWindow):
             'Rotate',
             Functions.rotate_image,
             manipulated_image,
-            [('Rotation Angle', 0, 0, 359, 1)],
-            [('Rotation Center X', manipulated_image.shape[1] // 2, 0, manipulated_image.shape[1], 1),
-             ('Rotation Center Y', manipulated_image.shape[0] // 2, 0, manipulated_image.shape[0], 1)]
+            *Fields.fields_for(Functions.rotate_image, manipulated_image)
         ))
         self.actions_dict['rotate_action'] = self.rotate_action
         self.reverse_action = QAction('&Negative', self)
@@ -491,8 +695,7 @@ class MainWindow(QMainWindow):
             'Change Color Balance',
             Functions.change_color_balance,
             manipulated_image,
-            [('Channel', 0, 0, 2, 1),
-             ('Amount', 0, -255, 255, 1)]
+            *Fields.fields_for(Functions.change_color_balance, manipulated_image)
         ))
         self.actions_dict['color_balance_action'] = self.color_balance_action
         self.color_brightness_action = QAction('Ch&ange Contrast and Brightness...', self)
@@ -500,9 +703,7 @@ class MainWindow(QMainWindow):
             'Change Contrast and Brightness',
             Functions.change_contrast_and_brightness,
             manipulated_image,
-            [('Alpha', 10, 0, 100, 1),
-             ('Beta', 0, -255, 255, 1)],
-            [('Gamma', 10, 0, 100, 1)]
+            *Fields.fields_for(Functions.change_contrast_and_brightness, manipulated_image)
         ))
         self.actions_dict['color_brightness_action'] = self.color_brightness_action
 
@@ -511,8 +712,7 @@ class MainWindow(QMainWindow):
             'Salt and Pepper Noise',
             Functions.salt_and_pepper_noise,
             manipulated_image,
-            [('Salt Vs Pepper(%)', 50, 0, 100, 1),
-             ('Amount(%)', 5, 0, 100, 1)]
+            *Fields.fields_for(Functions.salt_and_pepper_noise, manipulated_image)
         ))
         self.actions_dict['salt_and_pepper_noise_action'] = self.salt_and_pepper_noise_action
         self.gaussian_noise_action = QAction('&Gaussian Noise...', self)
@@ -520,8 +720,7 @@ class MainWindow(QMainWindow):
             'Gaussian Noise',
             Functions.gaussian_noise,
             manipulated_image,
-            [('Mean', 0, 0, 100, 1),
-             ('Variance', 0, 0, 100, 1)]
+            *Fields.fields_for(Functions.gaussian_noise, manipulated_image)
         ))
         self.actions_dict['gaussian_noise_action'] = self.gaussian_noise_action
         self.poisson_noise_action = QAction('&Poisson Noise', self)
@@ -532,8 +731,7 @@ class MainWindow(QMainWindow):
             'Speckle Noise',
             Functions.speckle_noise,
             manipulated_image,
-            [('Mean', 0, 0, 100, 1),
-             ('Variance', 0, 0, 100, 1)]
+            *Fields.fields_for(Functions.speckle_noise, manipulated_image)
         ))
         self.actions_dict['speckle_noise_action'] = self.speckle_noise_action
 
@@ -565,6 +763,13 @@ class MainWindow(QMainWindow):
         file_menu.addActions((self.open_action,
                               self.save_action,
                               self.save_as_action,
+                              self.save_options_action,
+                              file_menu.addSeparator(),
+                              self.open_session_action,
+                              self.save_session_action,
+                              file_menu.addSeparator(),
+                              self.export_recipe_action,
+                              self.apply_recipe_action,
                               file_menu.addSeparator(),
                               self.reset_action,
                               self.undo_action,
@@ -611,11 +816,13 @@ class MainWindow(QMainWindow):
         about_menu = menu_bar.addMenu('&About')
         about_menu.addAction(self.about_action)
 
+        menu_bar.setCornerWidget(self.status_text, Qt.TopRightCorner)
+
     def updateAllActions(self, value):
         for key, val in self.actions_dict.items():
             if key not in ['minimize_action', 'exit_action', 'close_action', 'about_action']:
                 val.setEnabled(value)
-        if is_grayscale(manipulated_image):
+        if image_history.info(image_history_index).is_grayscale():
             self.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
 
     def updateAllImageActions(self, value):
@@ -627,25 +834,49 @@ class MainWindow(QMainWindow):
         for ind, act in enumerate(actions):
             self.actions_dict[act].setEnabled(values[ind])
 
-    def drawLoadedImage(self, image_data):
-        aspect_ratio = image_data.shape[1] / image_data.shape[0]
-        new_width, new_height = IMAGE_WIDTH, int(IMAGE_WIDTH / aspect_ratio)
-        image_data_rgb = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
-        image_data_rgb = cv2.resize(image_data_rgb, (new_width, new_height))
-        image = QtGui.QImage(image_data_rgb, image_data_rgb.shape[1], image_data_rgb.shape[0], image_data_rgb.strides[0], QtGui.QImage.Format_RGB888)
-        self.loaded_image_frame.setPixmap(QtGui.QPixmap.fromImage(image))
-        self.updateLoadedFrameHeight(new_height)
-        self.updateMainWindowHeight()
-
-    def drawManipulatedImage(self, image_data):
+    def setStatus(self, text):
+        self.status_text.setText(text)
+        self.status_text.adjustSize()
+
+    @Trace.traced('MainWindow.createPixmap')
+    def createPixmap(self, image_data, cache_key=None):
+        pixmap = display_cache.get(cache_key) if cache_key is not None else None
+        if pixmap is not None:
+            return pixmap
         aspect_ratio = image_data.shape[1] / image_data.shape[0]
         new_width, new_height = IMAGE_WIDTH, int(IMAGE_WIDTH / aspect_ratio)
-        image_data_rgb = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
-        image_data_rgb = cv2.resize(image_data_rgb, (new_width, new_height))
-        image = QtGui.QImage(image_data_rgb, image_data_rgb.shape[1], image_data_rgb.shape[0], image_data_rgb.strides[0], QtGui.QImage.Format_RGB888)
-        self.manipulated_image_frame.setPixmap(QtGui.QPixmap.fromImage(image))
-        self.updateManipulatedFrameHeight(new_height)
-        self.updateMainWindowHeight()
+        interpolation = cv2.INTER_AREA if new_width < image_data.shape[1] else cv2.INTER_LINEAR
+        with Trace.span('MainWindow.createPixmap.resize'):
+            image_data_small = cv2.resize(image_data, (new_width, new_height), interpolation=interpolation)
+        if len(image_data_small.shape) == 2:
+            with Trace.span('MainWindow.createPixmap.QImage'):
+                image = QtGui.QImage(image_data_small, new_width, new_height, image_data_small.strides[0], QtGui.QImage.Format_Grayscale8)
+        else:
+            with Trace.span('MainWindow.createPixmap.cvtColor'):
+                image_data_small = cv2.cvtColor(image_data_small, cv2.COLOR_BGR2RGB)
+            with Trace.span('MainWindow.createPixmap.QImage'):
+                image = QtGui.QImage(image_data_small, new_width, new_height, image_data_small.strides[0], QtGui.QImage.Format_RGB888)
+        with Trace.span('MainWindow.createPixmap.fromImage'):
+            pixmap = QtGui.QPixmap.fromImage(image)
+        if cache_key is not None:
+            display_cache.put(cache_key, pixmap)
+        return pixmap
+
+    @Trace.traced('MainWindow.drawLoadedImage')
+    def drawLoadedImage(self, image_data, cache_key=None):
+        pixmap = self.createPixmap(image_data, cache_key)
+        with Trace.span('MainWindow.drawLoadedImage.layout'):
+            self.loaded_image_frame.setPixmap(pixmap)
+            self.updateLoadedFrameHeight(pixmap.height())
+            self.updateMainWindowHeight()
+
+    @Trace.traced('MainWindow.drawManipulatedImage')
+    def drawManipulatedImage(self, image_data, cache_key=None):
+        pixmap = self.createPixmap(image_data, cache_key)
+        with Trace.span('MainWindow.drawManipulatedImage.layout'):
+            self.manipulated_image_frame.setPixmap(pixmap)
+            self.updateManipulatedFrameHeight(pixmap.height())
+            self.updateMainWindowHeight()
 
     def updateLoadedFrameHeight(self, height):
         self.loaded_image_frame.setGeometry(0, MENU_BAR_HEIGHT, IMAGE_WIDTH, height)
@@ -656,6 +887,15 @@ class MainWindow(QMainWindow):
     def updateMainWindowHeight(self):
         self.setFixedSize(2 * IMAGE_WIDTH, max(self.loaded_image_frame.height(), self.manipulated_image_frame.height()))
 
+    def showStartScreen(self):
+        self.loaded_image_frame.clear()
+        self.manipulated_image_frame.clear()
+        self.updateLoadedFrameHeight(IMAGE_HEIGHT)
+        self.updateManipulatedFrameHeight(IMAGE_HEIGHT)
+        self.setFixedSize(2 * IMAGE_WIDTH, IMAGE_HEIGHT + MENU_BAR_HEIGHT)
+        self.start_text.setVisible(True)
+        self.updateAllImageActions(False)
+
     def createNewWindow(self, title, function, image_data, basic_fields=None, advanced_fields=None):
         if basic_fields is None:
             basic_fields = []
@@ -665,6 +905,10 @@ class MainWindow(QMainWindow):
         self.window.show()
         self.updateAllActions(False)
 
+    def createSaveOptionsWindow(self):
+        self.save_options_window = SaveOptionsWindow()
+        self.save_options_window.show()
+
     def createAboutWindow(self):
         self.about_window = AboutWindow()
         self.about_window.show()
@@ -679,21 +923,21 @@ class MainWindow(QMainWindow):
 
     def dragEnterEvent(self, event):
         file_name, file_extension = os.path.splitext(event.mimeData().urls()[0].toLocalFile())
-        if file_extension in ('.png', '.jpg', '.jpeg'):
+        if file_extension.lower() in IMAGE_EXTENSIONS:
             event.accept()
         else:
             event.ignore()
 
     def dragMoveEvent(self, event):
         file_name, file_extension = os.path.splitext(event.mimeData().urls()[0].toLocalFile())
-        if file_extension in ('.png', '.jpg', '.jpeg'):
+        if file_extension.lower() in IMAGE_EXTENSIONS:
             event.accept()
         else:
             event.ignore()
 
     def dropEvent(self, event):
         file_name, file_extension = os.path.splitext(event.mimeData().urls()[0].toLocalFile())
-        if file_extension in ('.png', '.jpg', '.jpeg'):
+        if file_extension.lower() in IMAGE_EXTENSIONS:
             event.setDropAction(Qt.CopyAction)
             file_path = event.mimeData().urls()[0].toLocalFile()
             open_file(file_path)
@@ -706,37 +950,128 @@ class MainWindow(QMainWindow):
 
 
 def open_file_action():
-    name = QFileDialog.getOpenFileName(caption='Open', filter='Image Files (*.png *.jpg *.jpeg)')
+    name = QFileDialog.getOpenFileName(caption='Open', filter='Image Files (*.png *.jpg *.jpeg *.webp)')
     if name[0] != '':
         open_file(name[0])
 
 
 def open_file(path):
-    global main_window, loaded_image, manipulated_image, image_history, image_history_index
+    global open_started, first_paint_ms
+
+    open_started = time.perf_counter()
+    reduction = ImageLoader.reduction_for(path, IMAGE_WIDTH)
+    if reduction == 1:
+        main_window.image_loader.cancel()
+        with Trace.span('open_file.read'):
+            image = cv2.imread(path)
+        finish_open_file(None, path, image)
+        return
+
+    first_image = ImageLoader.read_reduced(path, reduction)
+    if first_image is None:
+        main_window.setStatus('Could not open {}'.format(os.path.basename(path)))
+        return
+    main_window.updateAllImageActions(False)
+    main_window.image_loader.load(path)
+    main_window.drawLoadedImage(first_image)
+    main_window.drawManipulatedImage(first_image)
+    main_window.start_text.setVisible(False)
+    main_window.repaint()
+    first_paint_ms = (time.perf_counter() - open_started) * 1000
+    main_window.setStatus('First paint {:.0f} ms, loading full image...'.format(first_paint_ms))
+
+
+def finish_open_file(generation, path, image):
+    global main_window, loaded_image, loaded_path, manipulated_image, image_history, image_history_index
+
+    if generation is not None and not main_window.image_loader.isLatest(generation):
+        return
+    if image is None:
+        if generation is not None:  # The reduced first paint replaced the frames, so put back whatever was open before
+            if loaded_image.size == 0:
+                main_window.showStartScreen()
+            else:
+                show_opened_images()
+        main_window.setStatus('Could not open {}'.format(os.path.basename(path)))
+        return
+
+    loaded_image = image
+    loaded_path = path
+    manipulated_image = loaded_image
+    invalidate_preview_cache()
+    image_history.reset(manipulated_image)
+    image_history_index = 0
+    show_opened_images()
+    elapsed_ms = (time.perf_counter() - open_started) * 1000
+    if generation is None:
+        main_window.setStatus('Opened in {:.0f} ms'.format(elapsed_ms))
+    else:
+        main_window.setStatus('First paint {:.0f} ms, full image {:.0f} ms'.format(first_paint_ms, elapsed_ms))
+
 
-    loaded_image = cv2.imread(path)
-    manipulated_image = np.copy(loaded_image)
+def show_opened_images():
     main_window.updateAllImageActions(True)
-    main_window.drawLoadedImage(loaded_image)
-    main_window.drawManipulatedImage(manipulated_image)
-    image_history = [manipulated_image]
-    image_history_index = 0
+    main_window.drawLoadedImage(loaded_image, image_history.info(0))
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
     main_window.start_text.setVisible(False)
 
-    if is_grayscale(loaded_image):
+    if image_history.info(image_history_index).is_grayscale():
         main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
 
 
+def open_session_action():
+    name = QFileDialog.getOpenFileName(caption='Open Session', filter='Pixo Sessions (*{})'.format(Session.SESSION_EXTENSION))
+    if name[0] != '':
+        open_session(name[0])
+
+
+def open_session(path):
+    global loaded_image, loaded_path, manipulated_image, image_history, image_history_index
+
+    start_time = time.perf_counter()
+    try:
+        session = Session.load_session(path)
+    except (OSError, ValueError) as error:
+        main_window.setStatus('Could not open {}: {}'.format(os.path.basename(path), error))
+        return
+
+    main_window.image_loader.cancel()
+    loaded_image = session['base']
+    loaded_path = session['source']
+    image_history.restore(session['entries'], session['index'])
+    image_history_index = session['index']
+    manipulated_image = image_history[image_history_index]
+    invalidate_preview_cache()
+    show_opened_images()
+    main_window.setStatus('Opened session in {:.0f} ms'.format((time.perf_counter() - start_time) * 1000))
+
+
+def save_session_action():
+    global loaded_image, manipulated_image
+
+    name = QFileDialog.getSaveFileName(caption='Save Session', filter='Pixo Sessions (*{})'.format(Session.SESSION_EXTENSION))
+    if name[0] != '':
+        path = name[0] if name[0].lower().endswith(Session.SESSION_EXTENSION) else name[0] + Session.SESSION_EXTENSION
+        # Saving over the open session replaces a file we still map, so let go of every mapping first
+        image_history.detach_file(path)
+        if History.maps_file(loaded_image, path):
+            loaded_image = np.array(loaded_image)
+        if History.maps_file(manipulated_image, path):
+            manipulated_image = image_history[image_history_index]
+        state = Session.snapshot(image_history, loaded_image, image_history_index, loaded_path)
+        main_window.save_queue.submit(path, state, writer=Session.write_session)
+        main_window.setStatus('Saving session {}...'.format(os.path.basename(path)))
+
+
 def reset_image_action():
     global loaded_image, manipulated_image, image_history, image_history_index
 
-    if not np.array_equal(loaded_image, manipulated_image):
+    if image_history.content_hash(0) != image_history.content_hash(image_history_index):
         manipulated_image = loaded_image
-        main_window.drawManipulatedImage(manipulated_image)
+        invalidate_preview_cache()
+        push_history(manipulated_image, [('reset', [])])
+        main_window.drawManipulatedImage(manipulated_image, image_history.info(0))
         main_window.updateAllActions(True)
-        image_history_index += 1
-        image_history.insert(image_history_index, manipulated_image)
-        image_history = image_history[:image_history_index + 1]
 
 
 def undo_action():
@@ -745,11 +1080,10 @@ def undo_action():
     if image_history_index > 0:
         image_history_index -= 1
         manipulated_image = image_history[image_history_index]
-        main_window.drawManipulatedImage(manipulated_image)
-        if is_grayscale(manipulated_image):
-            main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
-        else:
-            main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [True, True])
+        invalidate_preview_cache()
+        main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
+        is_grayscale = image_history.info(image_history_index).is_grayscale()
+        main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [not is_grayscale, not is_grayscale])
 
 
 def redo_action():
@@ -758,79 +1092,109 @@ def redo_action():
     if image_history_index < len(image_history) - 1:
         image_history_index += 1
         manipulated_image = image_history[image_history_index]
-        main_window.drawManipulatedImage(manipulated_image)
-        if is_grayscale(manipulated_image):
-            main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
-        else:
-            main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [True, True])
+        invalidate_preview_cache()
+        main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
+        is_grayscale = image_history.info(image_history_index).is_grayscale()
+        main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [not is_grayscale, not is_grayscale])
 
 
 def save_file_action():
     global save_location
 
     if save_location is not None:
-        cv2.imwrite(save_location, manipulated_image)
+        save_image(save_location)
     else:
-        name = QFileDialog.getSaveFileName(caption='Save', filter='Image Files (*.png *.jpg *.jpeg)')
+        name = QFileDialog.getSaveFileName(caption='Save', filter='Image Files (*.png *.jpg *.jpeg *.webp)')
         if name[0] != '':
             save_location = name[0]
-            cv2.imwrite(name[0], manipulated_image)
+            save_image(name[0])
 
 
 def save_as_file_action():
-    name = QFileDialog.getSaveFileName(caption='Save', filter='Image Files (*.png *.jpg *.jpeg)')
+    name = QFileDialog.getSaveFileName(caption='Save', filter='Image Files (*.png *.jpg *.jpeg *.webp)')
+    if name[0] != '':
+        save_image(name[0])
+
+
+def save_image(path):
+    pending = main_window.save_queue.submit(path, manipulated_image, save_options)
+    if pending > 1:
+        main_window.setStatus('Queued {} ({} saves pending)'.format(os.path.basename(path), pending))
+    else:
+        main_window.setStatus('Saving {}...'.format(os.path.basename(path)))
+
+
+def export_recipe_action():
+    name = QFileDialog.getSaveFileName(caption='Export Recipe', filter='Recipe Files (*.json)')
+    if name[0] != '':
+        current_recipe().save(name[0])
+
+
+def apply_recipe_action():
+    global manipulated_image, image_history, image_history_index
+
+    name = QFileDialog.getOpenFileName(caption='Apply Recipe', filter='Recipe Files (*.json)')
     if name[0] != '':
-        cv2.imwrite(name[0], manipulated_image)
+        recipe = Recipe.Recipe.load(name[0])
+        steps = recipe.scaled_steps(manipulated_image)
+        manipulated_image = recipe.replay(manipulated_image)
+        invalidate_preview_cache()
+        push_history(manipulated_image, steps)
+        main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
+        main_window.updateAllActions(True)
 
 
 def exit_action():
+    if main_window is not None:
+        main_window.save_queue.stop()
     sys.exit()
 
 
 def remove_blur_action():
-    global manipulated_image
+    global manipulated_image, image_history, image_history_index
 
     manipulated_image = Functions.de_blur(manipulated_image)
-    main_window.drawManipulatedImage(manipulated_image)
+    invalidate_preview_cache()
+    push_history(manipulated_image, [('de_blur', [])])
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
 
 
 def reverse_action():
-    global manipulated_image
+    global manipulated_image, image_history, image_history_index
 
     manipulated_image = Functions.reverse_image(manipulated_image)
-    main_window.drawManipulatedImage(manipulated_image)
+    invalidate_preview_cache()
+    push_history(manipulated_image, [('reverse_image', [])])
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
 
 
 def grayscale_action():
     global manipulated_image, image_history, image_history_index
 
     manipulated_image = Functions.grayscale_image(manipulated_image)
-    main_window.drawManipulatedImage(manipulated_image)
+    invalidate_preview_cache()
+    push_history(manipulated_image, [('grayscale_image', [])])
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
     main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
-    image_history_index += 1
-    image_history.insert(image_history_index, manipulated_image)
-    image_history = image_history[:image_history_index + 1]
 
 
 def poisson_noise_action():
     global manipulated_image, image_history, image_history_index
 
     manipulated_image = Functions.poisson_noise(manipulated_image)
-    main_window.drawManipulatedImage(manipulated_image)
-    image_history_index += 1
-    image_history.insert(image_history_index, manipulated_image)
-    image_history = image_history[:image_history_index + 1]
+    invalidate_preview_cache()
+    push_history(manipulated_image, [('poisson_noise', [])])
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
 
 
 def naive_edge_detection_action():
     global manipulated_image, image_history, image_history_index
 
     manipulated_image = Functions.naive_edge_detect(manipulated_image)
-    main_window.drawManipulatedImage(manipulated_image)
+    invalidate_preview_cache()
+    push_history(manipulated_image, [('naive_edge_detect', [])])
+    main_window.drawManipulatedImage(manipulated_image, image_history.info(image_history_index))
     main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
-    image_history_index += 1
-    image_history.insert(image_history_index, manipulated_image)
-    image_history = image_history[:image_history_index + 1]
 
 
 def sobel_edge_detection_action():
@@ -838,9 +1202,7 @@ def sobel_edge_detection_action():
         'Sobel Edge Detection',
         Functions.sobel_edge_detect,
         manipulated_image,
-        [('Kernel Size', 1, 1, 7, 2)],
-        [('dX', 1, 0, 2, 1),
-         ('dY', 1, 0, 2, 1)]
+        *Fields.fields_for(Functions.sobel_edge_detect, manipulated_image)
     )
     main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
 
@@ -850,20 +1212,41 @@ def canny_edge_detection_action():
         'Canny Edge Detection',
         Functions.canny_edge_detect,
         manipulated_image,
-        [('Threshold 1', 0, 0, 1000, 1),
-         ('Threshold 2', 0, 0, 1000, 1)]
+        *Fields.fields_for(Functions.canny_edge_detect, manipulated_image)
     )
     main_window.updateActionAbility(['grayscale_action', 'color_balance_action'], [False, False])
 
 
-def clamp(x, m, M):
-    return max(min(x, M), m)
+def push_history(image, steps):
+    global image_history_index
+
+    image_history_index += 1
+    image_history.push(image_history_index, image, steps)
+
+
+def current_recipe():
+    return Recipe.Recipe(image_history.recorded_steps(image_history_index), loaded_image.shape[1], loaded_image.shape[0])
+
+
+def release_preview_buffer(image_data):
+    if image_data is not preview_image and not image_history.shares_memory(image_data):
+        preview_pool.release(image_data)
 
 
-def is_grayscale(image):
-    if len(image.shape) == 3 and (image[:, :, 0] == image[:, :, 1]).all() and (image[:, :, 0] == image[:, :, 2]).all():
-        return True
-    return False
+def release_evicted_previews():
+    while evicted_previews:
+        release_preview_buffer(evicted_previews.popleft())
+
+
+def invalidate_preview_cache():
+    global image_version
+
+    image_version += 1
+    preview_cache.clear()
+
+
+def clamp(x, m, M):
+    return max(min(x, M), m)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,110 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2.cv2 as cv2
+
+import Operations
+import Recipe
+import Saver
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def find_images(inputs):
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(pattern, name))
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+    return paths
+
+
+def output_path(path, output_dir, extension):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, name + (extension or os.path.splitext(path)[1]))
+
+
+def init_worker(threads):
+    cv2.setNumThreads(threads)
+
+
+def process_file(path, save_path, recipe):
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError('Could not read image: {}'.format(path))
+    Saver.write_image(save_path, recipe.replay(image))
+    return path
+
+
+def run_batch(paths, output_dir, recipe, workers=None, threads=1, extension=None, overwrite=False):
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    tasks = []
+    skipped = 0
+    for path in paths:
+        save_path = output_path(path, output_dir, extension)
+        if not overwrite and os.path.exists(save_path):
+            skipped += 1
+            continue
+        tasks.append((path, save_path))
+
+    processed, failed = 0, []
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(threads,)) as executor:
+        in_flight = {}
+        tasks.reverse()
+        while tasks or in_flight:
+            while tasks and len(in_flight) < 2 * workers:
+                path, save_path = tasks.pop()
+                in_flight[executor.submit(process_file, path, save_path, recipe)] = path
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                try:
+                    future.result()
+                    processed += 1
+                except Exception as error:
+                    failed.append((path, error))
+    elapsed = time.perf_counter() - start_time
+
+    return {'processed': processed,
+            'skipped': skipped,
+            'failed': failed,
+            'seconds': elapsed,
+            'images_per_second': processed / elapsed if elapsed > 0 else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply a chain of Pixo operations to many images.')
+    parser.add_argument('inputs', nargs='+', help='image directories or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='output directory')
+    steps = parser.add_mutually_exclusive_group(required=True)
+    steps.add_argument('--op', dest='operations', action='append', default=[], type=Operations.parse_operation,
+                       help='operation as name:arg1,arg2,... (repeatable, applied in order)')
+    steps.add_argument('--recipe', default=None, help='recipe file exported from the editor')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=1, help='OpenCV threads per worker')
+    parser.add_argument('--ext', default=None, help='output extension, e.g. .png (default: same as input)')
+    parser.add_argument('--overwrite', action='store_true', help='reprocess images whose output already exists')
+    args = parser.parse_args(argv)
+
+    recipe = Recipe.Recipe.load(args.recipe) if args.recipe else Recipe.Recipe(args.operations)
+
+    paths = find_images(args.inputs)
+    result = run_batch(paths, args.output, recipe, args.workers, args.threads, args.ext, args.overwrite)
+    for path, error in result['failed']:
+        print('Failed: {} ({})'.format(path, error), file=sys.stderr)
+    print('Processed {} images, skipped {}, failed {} in {:.2f}s ({:.2f} images/s)'.format(
+        result['processed'], result['skipped'], len(result['failed']), result['seconds'], result['images_per_second']))
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
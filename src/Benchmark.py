@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import cv2.cv2 as cv2
+
+import Fields
+import Operations
+
+TEST_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Test Images')
+PARAMETER_SETS = ('default', 'mid', 'max')
+REGRESSION_THRESHOLD = 0.2
+
+
+def synthetic_image(megapixels, channels=3, seed=0):
+    side = max(int(np.sqrt(megapixels * 1000000)), 8)
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (side // 8, side // 8, 3), dtype=np.uint8)
+    image = cv2.resize(image, (side, side), interpolation=cv2.INTER_LINEAR)
+    if channels == 1:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def field_value(field, parameter_set):
+    field_name, init_val, min_val, max_val, step_size = field
+    if parameter_set == 'max':
+        return True if (min_val, max_val) == (0, 1) else max_val
+    if parameter_set == 'mid':
+        if (min_val, max_val) == (0, 1):
+            return True
+        return init_val + int(round((max_val - init_val) / 2 / step_size)) * step_size
+    return init_val
+
+
+def parameter_sets(name, image):
+    if name in Operations.NO_ARGS_OPERATIONS:
+        return [('default', None)]
+    basic_fields, advanced_fields = Fields.fields_for(Operations.get_operation(name), image)
+    sets = []
+    for parameter_set in PARAMETER_SETS:
+        args = [field_value(field, parameter_set) for field in basic_fields + advanced_fields]
+        if all(args != previous_args for _, previous_args in sets):
+            sets.append((parameter_set, args))
+    return sets
+
+
+def benchmark_images(sizes, channel_counts, use_test_images):
+    for megapixels in sizes:
+        for channels in channel_counts:
+            yield '{}MP'.format(megapixels), synthetic_image(megapixels, channels)
+    if use_test_images and os.path.isdir(TEST_IMAGES_DIR):
+        for file_name in sorted(os.listdir(TEST_IMAGES_DIR)):
+            image = cv2.imread(os.path.join(TEST_IMAGES_DIR, file_name))
+            if image is not None:
+                yield file_name, image
+
+
+def measure(name, image, args, repeat):
+    call = (lambda: Operations.apply_operation(image, name)) if args is None else (lambda: Operations.apply_operation(image, name, args))
+    call()
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    call()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p95 = np.percentile(times, 50), np.percentile(times, 95)
+    megapixels = image.shape[0] * image.shape[1] / 1000000
+    return {'p50_ms': p50 * 1000,
+            'p95_ms': p95 * 1000,
+            'mp_per_s': megapixels / p50 if p50 > 0 else float('inf'),
+            'peak_bytes': int(peak_bytes)}
+
+
+def run_suite(names, sizes, channel_counts, repeat, use_test_images=True, log=None):
+    results = []
+    for image_name, image in benchmark_images(sizes, channel_counts, use_test_images):
+        channels = 1 if len(image.shape) == 2 else image.shape[2]
+        for name in names:
+            for parameter_set, args in parameter_sets(name, image):
+                result = {'id': '{}/{}/{}/{}ch'.format(name, parameter_set, image_name, channels),
+                          'operation': name,
+                          'parameters': parameter_set,
+                          'args': args,
+                          'image': image_name,
+                          'width': image.shape[1],
+                          'height': image.shape[0],
+                          'channels': channels}
+                try:
+                    result.update(measure(name, image, args, repeat))
+                except cv2.error as error:
+                    result['error'] = str(error).strip().splitlines()[-1]
+                except Exception as error:
+                    result['error'] = '{}: {}'.format(type(error).__name__, error) if str(error) else type(error).__name__
+                results.append(result)
+                if log is not None:
+                    log(result)
+    return results
+
+
+def compare(results, baseline_results, threshold=REGRESSION_THRESHOLD):
+    baseline = {result['id']: result for result in baseline_results if 'p50_ms' in result}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['id'])
+        if previous is not None and 'p50_ms' in result and result['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append((result['id'], previous['p50_ms'], result['p50_ms']))
+    return regressions
+
+
+def print_result(result):
+    if 'error' in result:
+        print('{:<56} error: {}'.format(result['id'], result['error']))
+    else:
+        print('{:<56}{:>10.2f}{:>10.2f}{:>12.1f}{:>12.1f}'.format(
+            result['id'], result['p50_ms'], result['p95_ms'], result['mp_per_s'], result['peak_bytes'] / 1000000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every operation in Functions.py.')
+    parser.add_argument('--operations', nargs='+', default=list(Operations.OPERATIONS), help='operations to run (default: all)')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4], help='synthetic image sizes in megapixels, e.g. 1 10 100')
+    parser.add_argument('--channels', type=int, nargs='+', default=[3, 1], choices=[1, 3], help='channel counts for synthetic images')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--no-test-images', action='store_true', help='skip the bundled Test Images')
+    parser.add_argument('-o', '--output', default=None, help='write results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='allowed p50 slowdown before flagging, e.g. 0.2')
+    args = parser.parse_args(argv)
+
+    for name in args.operations:
+        Operations.get_operation(name)
+
+    print('{:<56}{:>10}{:>10}{:>12}{:>12}'.format('case', 'p50 ms', 'p95 ms', 'MP/s', 'peak MB'))
+    results = run_suite(args.operations, args.sizes, args.channels, args.repeat, not args.no_test_images, print_result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({'python': platform.python_version(),
+                       'opencv': cv2.__version__,
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'cpu_count': os.cpu_count(),
+                       'results': results}, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)['results'], args.threshold)
+        for case_id, previous_ms, current_ms in regressions:
+            print('REGRESSION {}: {:.2f} ms -> {:.2f} ms'.format(case_id, previous_ms, current_ms))
+        print('{} regression(s) against {}'.format(len(regressions), args.baseline))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
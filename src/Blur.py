@@ -0,0 +1,222 @@
+import argparse
+import math
+import time
+
+import numpy as np
+import cv2.cv2 as cv2
+
+LARGE_GAUSSIAN_SIGMA = 8.0
+GAUSSIAN_BOX_PASSES = 4
+GAUSSIAN_COVERAGE = 3.0
+APPROXIMATE_BILATERAL_RADIUS = 2
+APPROXIMATE_BILATERAL_PSNR = 40.0
+BILATERAL_PROBE_ELEMENTS = 128 * 1024
+BILATERAL_PROBE_MIN_SAMPLES = 64
+
+
+def kernel_sigma(kernel_size):
+    return 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+
+
+def gaussian_sigmas(kernel_size, sigma):
+    if sigma > 0:
+        return sigma, sigma
+    return kernel_sigma(kernel_size[0]), kernel_sigma(kernel_size[1])
+
+
+def box_sizes(sigma, passes=GAUSSIAN_BOX_PASSES):
+    ideal_width = math.sqrt(12 * sigma * sigma / passes + 1)
+    lower_width = int(math.floor(ideal_width))
+    if lower_width % 2 == 0:
+        lower_width -= 1
+    lower_count = int(round((12 * sigma * sigma - passes * lower_width * lower_width - 4 * passes * lower_width - 3 * passes) / (-4 * lower_width - 4)))
+    return [lower_width if index < lower_count else lower_width + 2 for index in range(passes)]
+
+
+def axis_box_sizes(kernel_size, sigma, passes=GAUSSIAN_BOX_PASSES):
+    if kernel_size == 1:
+        return [1] * passes
+    return box_sizes(sigma, passes)
+
+
+def use_box_gaussian(kernel_size, sigma):
+    sigmas = gaussian_sigmas(kernel_size, sigma)
+    if max(sigmas) < LARGE_GAUSSIAN_SIGMA:
+        return False
+    for axis_kernel_size, axis_sigma in zip(kernel_size, sigmas):
+        if axis_kernel_size != 1 and axis_kernel_size < 2 * GAUSSIAN_COVERAGE * axis_sigma + 1:
+            return False
+    return True
+
+
+def box_gaussian_halo(kernel_size, sigma, passes=GAUSSIAN_BOX_PASSES):
+    sigma_x, sigma_y = gaussian_sigmas(kernel_size, sigma)
+    widths = axis_box_sizes(kernel_size[0], sigma_x, passes) + axis_box_sizes(kernel_size[1], sigma_y, passes)
+    return max(sum(width // 2 for width in widths[:passes]), sum(width // 2 for width in widths[passes:]))
+
+
+def box_gaussian(image, kernel_size, sigma, passes=GAUSSIAN_BOX_PASSES, out=None):
+    sigma_x, sigma_y = gaussian_sigmas(kernel_size, sigma)
+    widths_x, widths_y = axis_box_sizes(kernel_size[0], sigma_x, passes), axis_box_sizes(kernel_size[1], sigma_y, passes)
+    manipulated_image = cv2.blur(image, (widths_x[0], widths_y[0]), dst=out)
+    for width_x, width_y in zip(widths_x[1:], widths_y[1:]):
+        manipulated_image = cv2.blur(manipulated_image, (width_x, width_y), dst=manipulated_image)
+    return manipulated_image
+
+
+def gaussian_blur(image, kernel_size, sigma, out=None):
+    if use_box_gaussian(kernel_size, sigma):
+        return box_gaussian(image, kernel_size, sigma, out=out)
+    return cv2.GaussianBlur(image, kernel_size, sigma, dst=out, sigmaY=0)
+
+
+def bilateral_radius(kernel_size, sigma_space):
+    if sigma_space <= 0:
+        sigma_space = 1
+    radius = int(round(sigma_space * 1.5)) if kernel_size <= 0 else kernel_size // 2
+    return max(radius, 1)
+
+
+def bilateral_factor(kernel_size, sigma_space):
+    radius, factor = bilateral_radius(kernel_size, sigma_space), 1
+    while radius >= 2 * factor * APPROXIMATE_BILATERAL_RADIUS:
+        factor *= 2
+    return factor
+
+
+def small_bilateral_radius(kernel_size, sigma_space, factor=None):
+    factor = factor or bilateral_factor(kernel_size, sigma_space)
+    return max(int(round(bilateral_radius(kernel_size, sigma_space) / factor)), 1)
+
+
+def approximate_bilateral_halo(kernel_size, sigma_space):  # Covers every factor the error check may fall back to, in whole multiples of each
+    factor = bilateral_factor(kernel_size, sigma_space)
+    return -(-(bilateral_radius(kernel_size, sigma_space) + factor // 2) // factor) * factor
+
+
+def bilateral_offsets(radius, step=1):
+    steps = np.arange(-radius, radius + 1)
+    y, x = np.meshgrid(steps, steps, indexing='ij')
+    inside = y * y + x * x <= radius * radius
+    return y[inside] * step, x[inside] * step
+
+
+def sampled_bilateral(image, ys, xs, offsets, sigma_color, sigma_space):
+    offset_y, offset_x = offsets
+    image = image.reshape(image.shape[0], image.shape[1], -1)
+    center = image[ys, xs].astype(np.float32)
+    neighbours = image[ys[:, None] + offset_y[None, :], xs[:, None] + offset_x[None, :]].astype(np.float32)
+    distance = np.abs(neighbours - center[:, None, :]).sum(axis=2)
+    weight = np.exp(-0.5 * distance * distance / (sigma_color * sigma_color) - 0.5 * (offset_y * offset_y + offset_x * offset_x) / (sigma_space * sigma_space))
+    return (weight[:, :, None] * neighbours).sum(axis=1) / weight.sum(axis=1)[:, None]
+
+
+def checked_bilateral_factor(image, kernel_size, sigma_color, sigma_space, min_psnr=APPROXIMATE_BILATERAL_PSNR):
+    # Exact and approximate results at a fixed set of pixels pick the largest factor whose error stays under the bound
+    factor = bilateral_factor(kernel_size, sigma_space)
+    radius = bilateral_radius(kernel_size, sigma_space)
+    margin = radius + factor // 2
+    height, width = image.shape[:2]
+    if factor == 1 or height <= 2 * margin or width <= 2 * margin:
+        return 1
+    sigma_color, sigma_space = max(sigma_color, 1), max(sigma_space, 1)
+    exact_offsets = bilateral_offsets(radius)
+    count = max(BILATERAL_PROBE_ELEMENTS // len(exact_offsets[0]), BILATERAL_PROBE_MIN_SAMPLES)
+    state = np.random.RandomState(0)
+    ys, xs = state.randint(margin, height - margin, count), state.randint(margin, width - margin, count)
+    exact = sampled_bilateral(image, ys, xs, exact_offsets, sigma_color, sigma_space)
+    peak = 255.0 if image.dtype == np.uint8 else 1.0
+    while factor > 1:
+        offsets = bilateral_offsets(small_bilateral_radius(kernel_size, sigma_space, factor), factor)
+        error = sampled_bilateral(image, ys, xs, offsets, sigma_color, sigma_space) - exact
+        mse = float(np.mean(error * error))
+        if mse == 0 or 10 * math.log10(peak * peak / mse) >= min_psnr:
+            return factor
+        factor //= 2
+    return 1
+
+
+def approximate_bilateral(image, kernel_size, sigma_color, sigma_space, out=None, factor=None):
+    if factor is None:
+        factor = checked_bilateral_factor(image, kernel_size, sigma_color, sigma_space)
+    if factor == 1:
+        return cv2.bilateralFilter(image, kernel_size, sigma_color, sigma_space, dst=out)
+
+    # Every pixel is filtered against its own value, with every factor-th neighbour in each direction: splitting the image
+    # into factor x factor interleaved sub-images turns that into an ordinary bilateral filter with a factor times smaller kernel
+    small_radius = small_bilateral_radius(kernel_size, sigma_space, factor)
+    if out is None:
+        out = np.empty_like(image)
+    for y in range(factor):
+        for x in range(factor):
+            phase = np.ascontiguousarray(image[y::factor, x::factor])
+            out[y::factor, x::factor] = cv2.bilateralFilter(phase, 2 * small_radius + 1, sigma_color, max(sigma_space, 1) / factor)
+    return out
+
+
+def error_metrics(reference, approximation):
+    error = np.abs(approximation.astype(np.float64) - reference)
+    mse = float(np.mean(error * error))
+    peak = 255.0 if reference.dtype == np.uint8 else 1.0
+    return {'max_error': float(error.max()),
+            'mean_error': float(error.mean()),
+            'psnr': float('inf') if mse == 0 else 10 * math.log10(peak * peak / mse)}
+
+
+def validate_gaussian(image, kernel_size, sigma):
+    start_time = time.perf_counter()
+    reference = cv2.GaussianBlur(image, kernel_size, sigma, sigmaY=0)
+    reference_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    approximation = box_gaussian(image, kernel_size, sigma)
+    box_time = time.perf_counter() - start_time
+
+    result = error_metrics(reference, approximation)
+    result.update({'reference_ms': reference_time * 1000, 'box_ms': box_time * 1000})
+    return result
+
+
+def validate_bilateral(image, kernel_size, sigma_color, sigma_space):
+    start_time = time.perf_counter()
+    reference = cv2.bilateralFilter(image, kernel_size, sigma_color, sigma_space)
+    reference_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    factor = checked_bilateral_factor(image, kernel_size, sigma_color, sigma_space)
+    approximation = approximate_bilateral(image, kernel_size, sigma_color, sigma_space, factor=factor)
+    approximate_time = time.perf_counter() - start_time
+
+    result = error_metrics(reference, approximation)
+    result.update({'factor': factor, 'reference_ms': reference_time * 1000, 'approximate_ms': approximate_time * 1000})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the box-filter Gaussian and the approximate bilateral filter against OpenCV.')
+    parser.add_argument('image', help='image to blur')
+    parser.add_argument('--sigmas', type=float, nargs='+', default=[4, 8, 16, 32, 64], help='Gaussian sigmas to test')
+    parser.add_argument('--bilateral-sizes', type=int, nargs='+', default=[5, 9, 13, 19], help='bilateral kernel sizes to test')
+    parser.add_argument('--sigma-color', type=float, default=75, help='bilateral Sigma Color')
+    parser.add_argument('--sigma-space', type=float, default=75, help='bilateral Sigma Space')
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    print('{:>8}{:>8}{:>12}{:>12}{:>10}{:>14}{:>10}'.format('sigma', 'kernel', 'max error', 'mean error', 'PSNR', 'reference ms', 'box ms'))
+    for sigma in args.sigmas:
+        kernel_size = int(2 * math.ceil(GAUSSIAN_COVERAGE * sigma) + 1)
+        result = validate_gaussian(image, (kernel_size, kernel_size), sigma)
+        print('{:>8.1f}{:>8}{:>12.0f}{:>12.3f}{:>10.2f}{:>14.1f}{:>10.1f}'.format(
+            sigma, kernel_size, result['max_error'], result['mean_error'], result['psnr'], result['reference_ms'], result['box_ms']))
+
+    print()
+    print('{:>8}{:>8}{:>12}{:>12}{:>10}{:>14}{:>16}'.format('kernel', 'factor', 'max error', 'mean error', 'PSNR', 'reference ms', 'approximate ms'))
+    for kernel_size in args.bilateral_sizes:
+        result = validate_bilateral(image, kernel_size, args.sigma_color, args.sigma_space)
+        print('{:>8}{:>8}{:>12.0f}{:>12.3f}{:>10.2f}{:>14.1f}{:>16.1f}'.format(
+            kernel_size, result['factor'], result['max_error'], result['mean_error'], result['psnr'],
+            result['reference_ms'], result['approximate_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import threading
+import weakref
+
+import numpy as np
+
+
+class BufferPool:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.free = {}
+        self.free_bytes = 0
+        self.owned = {}
+        self.lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def forget(self, buffer_id):
+        with self.lock:
+            self.owned.pop(buffer_id, None)
+
+    def acquire(self, shape, dtype):
+        key = (tuple(shape), np.dtype(dtype))
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                buffer = buffers.pop()
+                self.free_bytes -= buffer.nbytes
+                self.reuses += 1
+                return buffer
+            self.allocations += 1
+        buffer = np.empty(shape, dtype)
+        buffer_id = id(buffer)
+        with self.lock:
+            self.owned[buffer_id] = weakref.ref(buffer, lambda _: self.forget(buffer_id))
+        return buffer
+
+    def release(self, buffer):
+        if not isinstance(buffer, np.ndarray):
+            return False
+        with self.lock:
+            reference = self.owned.get(id(buffer))
+            if reference is None or reference() is not buffer or self.free_bytes + buffer.nbytes > self.max_bytes:
+                return False
+            buffers = self.free.setdefault((buffer.shape, buffer.dtype), [])
+            if any(free_buffer is buffer for free_buffer in buffers):
+                return False
+            buffers.append(buffer)
+            self.free_bytes += buffer.nbytes
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.free.clear()
+            self.free_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'allocations': self.allocations,
+                    'reuses': self.reuses,
+                    'free_buffers': sum(len(buffers) for buffers in self.free.values()),
+                    'free_bytes': self.free_bytes}
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, max_bytes, sizeof=None, on_evict=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: value.nbytes)
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        evicted_values = []
+        with self.lock:
+            if key in self.entries:
+                replaced = self.entries.pop(key)
+                self.size_bytes -= self.sizeof(replaced)
+                if replaced is not value:
+                    evicted_values.append(replaced)
+            if size <= self.max_bytes:
+                self.entries[key] = value
+                self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size_bytes -= self.sizeof(evicted)
+                self.evictions += 1
+                evicted_values.append(evicted)
+        if self.on_evict is not None:
+            for evicted in evicted_values:
+                self.on_evict(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def hit_rate(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'entries': len(self.entries),
+                    'bytes': self.size_bytes,
+                    'max_bytes': self.max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,107 @@
+import math
+import threading
+import weakref
+
+import numpy as np
+import cv2.cv2 as cv2
+
+CACHE_BYTES = 512 * 1024 * 1024
+
+
+class EdgeData:
+    def __init__(self, image):
+        self.image_ref = weakref.ref(image)
+        self.gray = None
+        self.suppressed = None
+        self.last_low = None
+        self.labels_low = None
+        self.candidate_index = None
+        self.candidate_magnitude = None
+        self.candidate_labels = None
+        self.label_count = 0
+
+    def nbytes(self):
+        arrays = (self.gray, self.suppressed, self.candidate_index, self.candidate_magnitude, self.candidate_labels)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+
+cache = []
+lock = threading.Lock()
+
+
+def edge_data(image):
+    with lock:
+        for index, data in enumerate(cache):
+            if data.image_ref() is image:
+                cache.append(cache.pop(index))
+                return data
+        data = EdgeData(image)
+        cache[:] = [entry for entry in cache if entry.image_ref() is not None] + [data]
+        return data
+
+
+def enforce_budget():
+    with lock:
+        total_bytes = sum(data.nbytes() for data in cache)
+        while len(cache) > 1 and total_bytes > CACHE_BYTES:
+            total_bytes -= cache.pop(0).nbytes()
+
+
+def grayscale(image):
+    if len(image.shape) == 2:
+        return image
+    data = edge_data(image)
+    if data.gray is None:
+        data.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        enforce_budget()
+    return data.gray
+
+
+def suppressed_magnitude(image):
+    data = edge_data(image)
+    if data.suppressed is None:
+        gray = grayscale(image)
+        dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        magnitude = np.abs(dx).astype(np.uint16)
+        magnitude += np.abs(dy).astype(np.uint16)
+        magnitude[cv2.Canny(dx, dy, 0, 0) == 0] = 0
+        data.suppressed = magnitude
+        enforce_budget()
+    return data.suppressed
+
+
+def label_candidates(image, low):
+    data = edge_data(image)
+    suppressed = suppressed_magnitude(image)
+    candidates = (suppressed > low).view(np.uint8)
+    label_count, labels = cv2.connectedComponents(candidates, connectivity=8, ltype=cv2.CV_32S)
+    index_type = np.int32 if suppressed.size < 2 ** 31 else np.int64
+    data.candidate_index = np.flatnonzero(candidates).astype(index_type)
+    data.candidate_magnitude = suppressed.ravel()[data.candidate_index]
+    data.candidate_labels = labels.ravel()[data.candidate_index]
+    data.label_count = label_count
+    data.labels_low = low
+    enforce_budget()
+    return data
+
+
+def hysteresis(data, high, shape, out=None):
+    keep = np.zeros(data.label_count, bool)
+    keep[data.candidate_labels[data.candidate_magnitude > high]] = True
+    if out is None or out.shape != shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+        out = np.empty(shape, np.uint8)
+    out.fill(0)
+    out.ravel()[data.candidate_index[keep[data.candidate_labels]]] = 255
+    return out
+
+
+def canny(image, threshold1, threshold2, out=None):
+    low, high = math.floor(min(threshold1, threshold2)), math.floor(max(threshold1, threshold2))
+    data = edge_data(image)
+    if data.labels_low == low:
+        return hysteresis(data, high, image.shape[:2], out)
+    if data.last_low == low:
+        return hysteresis(label_candidates(image, low), high, image.shape[:2], out)
+    data.last_low = low
+    return cv2.Canny(grayscale(image), threshold1, threshold2, edges=out)
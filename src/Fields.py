@@ -0,0 +1,79 @@
+import Functions
+
+FIELDS = {
+    Functions.box_blur: ([('Kernel Size X', 1, 1, 601, 1),
+                          ('Kernel Size Y', 1, 1, 601, 1)],
+                         []),
+    Functions.gaussian_blur: ([('Kernel Size X', 1, 1, 601, 2),
+                               ('Kernel Size Y', 1, 1, 601, 2)],
+                              [('Std Deviation', 0, 0, 1000, 1)]),
+    Functions.median_blur: ([('Kernel Size', 1, 1, 49, 2)],
+                            []),
+    Functions.bilateral_blur: ([('Kernel Size', 1, 1, 19, 1)],
+                               [('Sigma Color', 0, 0, 300, 5),
+                                ('Sigma Space', 0, 0, 300, 5),
+                                ('Fast Approximation', False, 0, 1, 1)]),
+    Functions.flip_image: ([('Flip Horizontal', False, 0, 1, 1),
+                            ('Flip Vertical', False, 0, 1, 1)],
+                           []),
+    Functions.mirror_image: ([('Mirror Horizontal', False, 0, 1, 1),
+                              ('Mirror Vertical', False, 0, 1, 1)],
+                             []),
+    Functions.change_color_balance: ([('Channel', 0, 0, 2, 1),
+                                      ('Amount', 0, -255, 255, 1)],
+                                     []),
+    Functions.change_contrast_and_brightness: ([('Alpha', 10, 0, 100, 1),
+                                                ('Beta', 0, -255, 255, 1)],
+                                               [('Gamma', 10, 0, 100, 1)]),
+    Functions.salt_and_pepper_noise: ([('Salt Vs Pepper(%)', 50, 0, 100, 1),
+                                       ('Amount(%)', 5, 0, 100, 1)],
+                                      []),
+    Functions.gaussian_noise: ([('Mean', 0, 0, 100, 1),
+                                ('Variance', 0, 0, 100, 1)],
+                               []),
+    Functions.speckle_noise: ([('Mean', 0, 0, 100, 1),
+                               ('Variance', 0, 0, 100, 1)],
+                              []),
+    Functions.sobel_edge_detect: ([('Kernel Size', 1, 1, 7, 2)],
+                                  [('dX', 1, 0, 2, 1),
+                                   ('dY', 1, 0, 2, 1)]),
+    Functions.canny_edge_detect: ([('Threshold 1', 0, 0, 1000, 1),
+                                   ('Threshold 2', 0, 0, 1000, 1)],
+                                  []),
+}
+
+
+def crop_fields(image):
+    return ([('X1', 0, 0, image.shape[1] - 2, 1),
+             ('X2', image.shape[1], 2, image.shape[1], 1),
+             ('Y1', 0, 0, image.shape[0] - 2, 1),
+             ('Y2', image.shape[0], 2, image.shape[0], 1)],
+            [])
+
+
+def rotate_fields(image):
+    return ([('Rotation Angle', 0, 0, 359, 1)],
+            [('Rotation Center X', image.shape[1] // 2, 0, image.shape[1], 1),
+             ('Rotation Center Y', image.shape[0] // 2, 0, image.shape[0], 1)])
+
+
+IMAGE_FIELDS = {
+    Functions.crop_image: crop_fields,
+    Functions.rotate_image: rotate_fields,
+}
+
+
+def fields_for(function, image):
+    if function in IMAGE_FIELDS:
+        return IMAGE_FIELDS[function](image)
+    return FIELDS[function]
+
+
+SAVE_OPTION_FIELDS = [('jpeg_quality', 'JPEG Quality', 0, 100, 1),
+                      ('jpeg_progressive', 'Progressive JPEG', 0, 1, 1),
+                      ('png_compression', 'PNG Compression', 0, 9, 1),
+                      ('webp_quality', 'WebP Quality', 1, 101, 1)]
+
+
+def save_fields(options):
+    return [(field_name, options[key], min_val, max_val, step_size) for key, field_name, min_val, max_val, step_size in SAVE_OPTION_FIELDS]
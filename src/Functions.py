@@ -1,6 +1,10 @@
 import numpy as np
 import cv2.cv2 as cv2
-import skimage
+
+import Blur
+import Edges
+import LUT
+import Noise
 
 
 def load_image(image_path):
@@ -18,39 +22,48 @@ def save_image(save_path, image):
     return image
 
 
-def box_blur(image, args):
+def copy_image(image, out=None):  # No-op edits still return a new array: the history and the preview pool tell states apart by identity
+    if out is not None and out.shape == image.shape and out.dtype == image.dtype:
+        np.copyto(out, image)
+        return out
+    return image.copy()
+
+
+def box_blur(image, args, out=None):
     kernel_size = (args[0], args[1])
-    manipulated_image = cv2.blur(image, kernel_size)
+    manipulated_image = cv2.blur(image, kernel_size, dst=out)
     return manipulated_image
 
 
-def gaussian_blur(image, args):
+def gaussian_blur(image, args, out=None):
     kernel_size = (args[0], args[1])
     sigma_x = args[2] / 10
-    manipulated_image = cv2.GaussianBlur(image, kernel_size, sigma_x, 0)
+    manipulated_image = Blur.gaussian_blur(image, kernel_size, sigma_x, out)
     return manipulated_image
 
 
-def median_blur(image, args):
+def median_blur(image, args, out=None):
     kernel_size = args[0]
-    manipulated_image = cv2.medianBlur(image, kernel_size)
+    manipulated_image = cv2.medianBlur(image, kernel_size, dst=out)
     return manipulated_image
 
 
-def bilateral_blur(image, args):
+def bilateral_blur(image, args, out=None):
     kernel_size = args[0]
     sigma_color, sigma_space = args[1], args[2]
-    manipulated_image = cv2.bilateralFilter(image, kernel_size, sigma_color, sigma_space)
+    if len(args) > 3 and args[3]:
+        return Blur.approximate_bilateral(image, kernel_size, sigma_color, sigma_space, out)
+    manipulated_image = cv2.bilateralFilter(image, kernel_size, sigma_color, sigma_space, dst=out)
     return manipulated_image
 
 
-def de_blur(image):
+def de_blur(image, out=None):
     de_blur_kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-    manipulated_image = cv2.filter2D(image, -1, de_blur_kernel)
+    manipulated_image = cv2.filter2D(image, -1, de_blur_kernel, dst=out)
     return manipulated_image
 
 
-def crop_image(image, args):
+def crop_image(image, args, out=None):
     x1, x2, y1, y2 = args
     if x1 > x2:
         x1, x2 = x2, x1
@@ -60,118 +73,116 @@ def crop_image(image, args):
     return manipulated_image
 
 
-def flip_image(image, args):  # Axis 0 = X, Axis 1 = Y
+def flip_image(image, args, out=None):  # Axis 0 = X, Axis 1 = Y
     axis_x, axis_y = args
-    manipulated_image = np.copy(image)
-    if axis_x == 1:
-        manipulated_image = cv2.flip(manipulated_image, 0)
-    if axis_y == 1:
-        manipulated_image = cv2.flip(manipulated_image, 1)
+    if axis_x == 1 and axis_y == 1:
+        manipulated_image = cv2.flip(image, -1, dst=out)
+    elif axis_x == 1:
+        manipulated_image = cv2.flip(image, 0, dst=out)
+    elif axis_y == 1:
+        manipulated_image = cv2.flip(image, 1, dst=out)
+    else:
+        manipulated_image = copy_image(image, out)
     return manipulated_image
 
 
-def mirror_image(image, args):
+def mirror_image(image, args, out=None):
     axis_x, axis_y = args
-    manipulated_image = np.copy(image)
+    height, width = image.shape[:2]
+    shape = (2 * height if axis_x else height, 2 * width if axis_y else width) + image.shape[2:]
+    manipulated_image = out if out is not None and out.shape == shape and out.dtype == image.dtype else np.empty(shape, image.dtype)
+    manipulated_image[:height, :width] = image
     if axis_x:
-        flipped_image = cv2.flip(manipulated_image, 0)
-        manipulated_image = np.vstack((manipulated_image, flipped_image))
+        manipulated_image[height:, :width] = image[::-1]
     if axis_y:
-        flipped_image = cv2.flip(manipulated_image, 1)
-        manipulated_image = np.hstack((manipulated_image, flipped_image))
+        manipulated_image[:, width:] = manipulated_image[:, width - 1::-1]
     return manipulated_image
 
 
-def rotate_image(image, args):
+def rotate_image(image, args, out=None):
     angle, image_center_x, image_center_y = args
     rot_mat = cv2.getRotationMatrix2D((image_center_x, image_center_y), angle, 1.0)
-    manipulated_image = cv2.warpAffine(image, rot_mat, image.shape[1::-1], flags=cv2.INTER_LINEAR)
+    manipulated_image = cv2.warpAffine(image, rot_mat, image.shape[1::-1], dst=out, flags=cv2.INTER_LINEAR)
     return manipulated_image
 
 
-def reverse_image(image):
-    manipulated_image = cv2.bitwise_not(image)
+def reverse_image(image, out=None):
+    manipulated_image = cv2.bitwise_not(image, dst=out)
     return manipulated_image
 
 
-def grayscale_image(image):
-    manipulated_image = np.copy(image)
-    if len(image.shape) > 2:
-        manipulated_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def grayscale_image(image, out=None):
+    if len(image.shape) == 2:
+        return copy_image(image, out)
+    manipulated_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
     return manipulated_image
 
 
-def change_color_balance(image, args):
+def change_color_balance(image, args, out=None):
     channel, amount = args
-    manipulated_image = cv2.cvtColor(np.copy(image), cv2.COLOR_BGR2RGB)
-    look_up_table = np.empty((1, 256), np.uint8)
-    for i in range(256):
-        look_up_table[0][i] = np.clip(i + amount, 0, 255)
-    manipulated_image[:, :, channel] = cv2.LUT(manipulated_image[:, :, channel], look_up_table)
-    manipulated_image = cv2.cvtColor(manipulated_image, cv2.COLOR_RGB2BGR)
+    manipulated_image = LUT.apply(image, LUT.color_balance_table(channel, amount), out)
     return manipulated_image
 
 
-def change_contrast_and_brightness(image, args):
+def change_contrast_and_brightness(image, args, out=None):
     alpha, beta, gamma = args
     alpha, gamma = alpha / 10, gamma / 10
-    look_up_table1 = np.empty((1, 256), np.uint8)
-    look_up_table2 = np.empty((1, 256), np.uint8)
-    for i in range(256):
-        look_up_table1[0][i] = np.clip(alpha * i + beta, 0, 255)
-        look_up_table2[0][i] = np.clip(pow(i / 255.0, gamma) * 255.0, 0, 255)
-    manipulated_image = cv2.LUT(cv2.LUT(image, look_up_table1), look_up_table2)
+    manipulated_image = LUT.apply(image, LUT.contrast_and_brightness_table(alpha, beta, gamma), out)
     return manipulated_image
 
 
-def salt_and_pepper_noise(image, args):
-    salt_vs_pepper, amount = args
+def salt_and_pepper_noise(image, args, seed=None, out=None):  # An optional third arg is the seed recorded by the editor
+    salt_vs_pepper, amount = args[:2]
+    if len(args) > 2:
+        seed = args[2]
     salt_vs_pepper, amount = salt_vs_pepper / 100, amount / 100
-    noise_image = skimage.util.random_noise(image=image, mode='s&p', salt_vs_pepper=salt_vs_pepper, amount=amount)
-    manipulated_image = np.array(255 * noise_image, dtype='uint8')
+    manipulated_image = Noise.salt_and_pepper(image, salt_vs_pepper, amount, seed, out)
     return manipulated_image
 
 
-def gaussian_noise(image, args):
-    mean, var = args
+def gaussian_noise(image, args, seed=None, out=None):  # An optional third arg is the seed recorded by the editor
+    mean, var = args[:2]
+    if len(args) > 2:
+        seed = args[2]
     mean, var = mean / 10, var / 10
-    noise_image = skimage.util.random_noise(image=image, mode='gaussian', mean=mean, var=var)
-    manipulated_image = np.array(255 * noise_image, dtype='uint8')
+    manipulated_image = Noise.gaussian(image, mean, var, seed, out)
     return manipulated_image
 
 
-def poisson_noise(image):
-    noise_image = skimage.util.random_noise(image=image, mode='poisson')
-    manipulated_image = np.array(255 * noise_image, dtype='uint8')
+def poisson_noise(image, seed=None, out=None):
+    manipulated_image = Noise.poisson(image, seed, out)
     return manipulated_image
 
 
-def speckle_noise(image, args):
-    mean, var = args
+def speckle_noise(image, args, seed=None, out=None):  # An optional third arg is the seed recorded by the editor
+    mean, var = args[:2]
+    if len(args) > 2:
+        seed = args[2]
     mean, var = mean / 10, var / 10
-    noise_image = skimage.util.random_noise(image=image, mode='speckle', mean=mean, var=var)
-    manipulated_image = np.array(255 * noise_image, dtype='uint8')
+    manipulated_image = Noise.speckle(image, mean, var, seed, out)
     return manipulated_image
 
 
-def naive_edge_detect(image):
-    grayscaled_image = grayscale_image(image)
+def naive_edge_detect(image, out=None):
+    grayscaled_image = Edges.grayscale(image)
     detection_kernel = np.array([[-1, -1, -1], [-1, 7, -1], [-1, -1, -1]])
-    manipulated_image = cv2.filter2D(grayscaled_image, -1, detection_kernel)
+    manipulated_image = cv2.filter2D(grayscaled_image, -1, detection_kernel, dst=out)
     return manipulated_image
 
 
-def sobel_edge_detect(image, args):
+def sobel_edge_detect(image, args, out=None):
     kernel_size, dx, dy = args
     if dx == 0 and dy == 0:
-        return np.zeros(image.shape[:2]).astype('uint8')
-    grayscaled_image = grayscale_image(image)
-    manipulated_image = cv2.Sobel(grayscaled_image, ksize=kernel_size, dx=dx, dy=dy, ddepth=cv2.CV_8U)
+        if out is not None and out.shape == image.shape[:2] and out.dtype == np.uint8:
+            out.fill(0)
+            return out
+        return np.zeros(image.shape[:2], np.uint8)
+    grayscaled_image = Edges.grayscale(image)
+    manipulated_image = cv2.Sobel(grayscaled_image, ksize=kernel_size, dx=dx, dy=dy, ddepth=cv2.CV_8U, dst=out)
     return manipulated_image
 
 
-def canny_edge_detect(image, args):
+def canny_edge_detect(image, args, out=None):
     t1, t2 = args
-    grayscaled_image = grayscale_image(image)
-    manipulated_image = cv2.Canny(grayscaled_image, t1, t2)
+    manipulated_image = Edges.canny(image, t1, t2, out)
     return manipulated_image
@@ -0,0 +1,78 @@
+import numpy as np
+import cv2.cv2 as cv2
+
+GEOMETRIC_OPERATIONS = ('crop_image', 'flip_image', 'rotate_image')
+
+
+def crop_bounds(args, width, height):
+    x1, x2, y1, y2 = args
+    if x1 > x2:
+        x1, x2 = x2, x1
+    if y1 > y2:
+        y1, y2 = y2, y1
+    x1, x2, _ = slice(x1, x2).indices(width)
+    y1, y2, _ = slice(y1, y2).indices(height)
+    return x1, max(x1, x2), y1, max(y1, y2)
+
+
+def translation_matrix(dx, dy):
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], np.float64)
+
+
+def flip_matrix(flip_columns, flip_rows, width, height):
+    return np.array([[-1 if flip_columns else 1, 0, width - 1 if flip_columns else 0],
+                     [0, -1 if flip_rows else 1, height - 1 if flip_rows else 0],
+                     [0, 0, 1]], np.float64)
+
+
+class GeometryChain:
+    def __init__(self, image):
+        self.image = image
+        self.matrix = None
+        self.width, self.height = image.shape[1], image.shape[0]
+
+    def crop(self, args):
+        x1, x2, y1, y2 = crop_bounds(args, self.width, self.height)
+        if self.matrix is None:
+            self.image = self.image[y1:y2, x1:x2]
+        else:
+            self.matrix = translation_matrix(-x1, -y1) @ self.matrix
+        self.width, self.height = x2 - x1, y2 - y1
+
+    def flip(self, args):  # Axis 0 = X, Axis 1 = Y, as in Functions.flip_image
+        flip_rows, flip_columns = args[0] == 1, args[1] == 1
+        if self.matrix is None:
+            self.image = self.image[::-1 if flip_rows else 1, ::-1 if flip_columns else 1]
+        else:
+            self.matrix = flip_matrix(flip_columns, flip_rows, self.width, self.height) @ self.matrix
+
+    def rotate(self, args):
+        angle, image_center_x, image_center_y = args
+        if self.matrix is not None:
+            self.image = self.render()
+        flip_rows, flip_columns = self.image.strides[0] < 0, self.image.strides[1] < 0
+        self.image = self.image[::-1 if flip_rows else 1, ::-1 if flip_columns else 1]
+        rotation = np.vstack((cv2.getRotationMatrix2D((image_center_x, image_center_y), angle, 1.0), (0, 0, 1)))
+        self.matrix = rotation @ flip_matrix(flip_columns, flip_rows, self.width, self.height)
+
+    def apply(self, name, args):
+        if name == 'crop_image':
+            self.crop(args)
+        elif name == 'flip_image':
+            self.flip(args)
+        elif name == 'rotate_image':
+            self.rotate(args)
+        else:
+            raise ValueError('Not a geometric operation: {}'.format(name))
+
+    def render(self):
+        if self.matrix is None:
+            return self.image
+        return cv2.warpAffine(self.image, self.matrix[:2], (self.width, self.height), flags=cv2.INTER_LINEAR)
+
+
+def apply_steps(image, steps):
+    chain = GeometryChain(image)
+    for name, args in steps:
+        chain.apply(name, args)
+    return chain.render()
@@ -0,0 +1,313 @@
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2.cv2 as cv2
+
+HISTORY_BYTES = 1024 * 1024 * 1024
+RAW_RADIUS = 1
+PNG_COMPRESSION = 1
+EQUALITY_CHECK_ROWS = 64
+
+CHANNEL_PRESERVING_OPERATIONS = ('box_blur', 'gaussian_blur', 'median_blur', 'bilateral_blur', 'de_blur', 'crop_image', 'flip_image',
+                                 'mirror_image', 'rotate_image', 'reverse_image', 'change_contrast_and_brightness')
+
+
+def channels_equal(image):
+    if len(image.shape) == 2 or image.shape[2] == 1:
+        return True
+    height = image.shape[0]
+    sample_step = max(height // EQUALITY_CHECK_ROWS, 1)
+    row_blocks = [slice(0, height, sample_step)] + [slice(y, y + EQUALITY_CHECK_ROWS) for y in range(0, height, EQUALITY_CHECK_ROWS)]
+    for rows in row_blocks:
+        block = image[rows]
+        for channel in range(1, image.shape[2]):
+            if not np.array_equal(block[:, :, 0], block[:, :, channel]):
+                return False
+    return True
+
+
+class ImageInfo:
+    def __init__(self, shape, dtype, channels_equal_value, content_hash=None):
+        self.shape = shape
+        self.dtype = dtype
+        self.channels = 1 if len(shape) == 2 else shape[2]
+        self.channels_equal = channels_equal_value
+        self.content_hash = content_hash
+
+    def is_grayscale(self):
+        return self.channels == 1 or self.channels_equal
+
+    @staticmethod
+    def from_image(image, channels_equal_value=None):
+        if channels_equal_value is None:
+            channels_equal_value = channels_equal(image)
+        return ImageInfo(image.shape, image.dtype, channels_equal_value)
+
+
+def hash_image(image):  # Shape and dtype are hashed too, so the same bytes laid out differently never compare equal
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('{}{}'.format(image.shape, np.dtype(image.dtype).str).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def derive_info(parent_info, steps, image):
+    if len(image.shape) == 2 or image.shape[2] == 1:
+        return ImageInfo.from_image(image, True)
+    if parent_info is not None and parent_info.channels == image.shape[2] and all(name in CHANNEL_PRESERVING_OPERATIONS for name, _ in steps):
+        return ImageInfo.from_image(image, parent_info.channels_equal)
+    return ImageInfo.from_image(image)
+
+
+class HistoryEntry:
+    def __init__(self, image, steps=None, info=None):
+        self.image = image
+        self.steps = steps or []
+        self.info = info if info is not None else ImageInfo.from_image(image)
+        self.blob = None
+        self.codec = None
+        self.path = None
+        self.mapped = None
+        self.shape = image.shape if image is not None else self.info.shape
+        self.dtype = image.dtype if image is not None else self.info.dtype
+
+    def memory_bytes(self):  # Arrays mapped from a session file live in the page cache, not in our budget
+        size = 0
+        if self.image is not None and not isinstance(self.image, np.memmap):
+            size += self.image.nbytes
+        if self.blob is not None and not isinstance(self.blob, np.memmap):
+            size += len(self.blob)
+        return size
+
+
+def map_array(path, offset, shape, dtype):
+    return np.memmap(path, dtype=dtype, mode='c', shape=tuple(shape), offset=offset)
+
+
+def maps_file(array, path):
+    return isinstance(array, np.memmap) and array.filename is not None and os.path.normcase(array.filename) == os.path.normcase(os.path.abspath(path))
+
+
+def encode(image):
+    if image.dtype == np.uint8 and (image.ndim == 2 or image.shape[2] in (1, 3, 4)):
+        success, blob = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+        if success:
+            return 'png', blob.tobytes()
+    return 'zlib', zlib.compress(np.ascontiguousarray(image).data, 1)
+
+
+def decode(entry):
+    if entry.codec == 'png':
+        image = cv2.imdecode(np.frombuffer(entry.blob, np.uint8), cv2.IMREAD_UNCHANGED)
+        return image.reshape(entry.shape)
+    return np.frombuffer(zlib.decompress(entry.blob), entry.dtype).reshape(entry.shape).copy()
+
+
+class ImageHistory:
+    def __init__(self, max_bytes=HISTORY_BYTES, raw_radius=RAW_RADIUS):
+        self.max_bytes = max_bytes
+        self.raw_radius = raw_radius
+        self.entries = []
+        self.focus = -1
+        self.lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.maintenance_pending = False
+        self.spill_dir = None
+        self.spill_count = 0
+        self.stale_spills = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        with self.lock:
+            entry = self.entries[index]
+            image = self.load(entry)
+            self.set_focus(index if index >= 0 else len(self.entries) + index)
+            return image
+
+    def reset(self, image):
+        with self.lock:
+            for entry in self.entries:
+                self.discard(entry)
+            self.entries = [HistoryEntry(image)]
+            self.set_focus(0)
+
+    def restore(self, entries, index):
+        with self.lock:
+            for entry in self.entries:
+                self.discard(entry)
+            self.entries = list(entries)
+            self.set_focus(index)
+
+    def snapshot(self):
+        with self.lock:
+            items = []
+            for entry in self.entries:
+                if entry.image is not None:
+                    payload = ('raw', entry.image)
+                elif entry.blob is not None:
+                    payload = (entry.codec, entry.blob)
+                elif entry.mapped is not None:
+                    payload = ('raw', entry.mapped)
+                else:
+                    payload = ('raw', map_array(entry.path, 0, entry.shape, entry.dtype))
+                items.append((entry.steps, entry.info, payload))
+            return items
+
+    def shares_memory(self, image):
+        with self.lock:
+            return any(entry.image is not None and np.may_share_memory(entry.image, image) for entry in self.entries)
+
+    def info(self, index):
+        with self.lock:
+            return self.entries[index].info
+
+    def content_hash(self, index):
+        with self.lock:
+            entry = self.entries[index]
+            if entry.info.content_hash is None:
+                entry.info.content_hash = hash_image(self.load(entry))
+            return entry.info.content_hash
+
+    def push(self, index, image, steps=None):
+        with self.lock:
+            for entry in self.entries[index:]:
+                self.discard(entry)
+            steps = steps or []
+            parent_info = self.entries[index - 1].info if index > 0 else None
+            derived_steps = steps
+            reset_indices = [ind for ind, (name, _) in enumerate(steps) if name == 'reset']
+            if reset_indices:
+                parent_info = self.entries[0].info
+                derived_steps = steps[reset_indices[-1] + 1:]
+            info = derive_info(parent_info, derived_steps, image)
+            if reset_indices and not derived_steps:
+                info.content_hash = parent_info.content_hash
+            self.entries = self.entries[:index] + [HistoryEntry(image, steps, info)]
+            self.set_focus(index)
+
+    def recorded_steps(self, index):
+        with self.lock:
+            return [step for entry in self.entries[1:index + 1] for step in entry.steps]
+
+    def set_focus(self, index):
+        self.focus = index
+        if not self.maintenance_pending:
+            self.maintenance_pending = True
+            self.executor.submit(self.maintain)
+
+    def is_hot(self, index):
+        return abs(index - self.focus) <= self.raw_radius
+
+    def load(self, entry):
+        if entry.image is not None:
+            return entry.image
+        if entry.blob is not None:
+            entry.image = decode(entry)
+        elif entry.mapped is not None:
+            entry.image = entry.mapped
+        else:
+            entry.image = np.array(np.memmap(entry.path, dtype=entry.dtype, mode='r', shape=entry.shape))
+        return entry.image
+
+    def discard(self, entry):
+        entry.image = None
+        entry.blob = None
+        entry.mapped = None
+        if entry.path is not None:
+            self.remove_spill(entry.path)
+            entry.path = None
+
+    def remove_spill(self, path):
+        try:
+            os.remove(path)
+        except PermissionError:  # Windows will not delete a file that a session save is still reading, so retry on a later pass
+            self.stale_spills.append(path)
+
+    def detach_file(self, path):
+        # Windows cannot replace a file that is still mapped, so states read from it move to memory, or to a spill file when cold
+        with self.lock:
+            for index, entry in enumerate(self.entries):
+                if maps_file(entry.blob, path):
+                    entry.blob = np.array(entry.blob)
+                if maps_file(entry.mapped, path):
+                    entry.image, entry.mapped = entry.mapped, None
+                if maps_file(entry.image, path):
+                    if self.is_hot(index):
+                        entry.image = np.array(entry.image)
+                    else:
+                        self.spill(entry)
+
+    def maintain(self):
+        with self.lock:
+            self.maintenance_pending = False
+            snapshot = list(enumerate(self.entries))
+            stale_spills, self.stale_spills = self.stale_spills, []
+            for path in stale_spills:
+                self.remove_spill(path)
+
+        for index, entry in snapshot:
+            with self.lock:
+                if entry not in self.entries:
+                    continue
+                hot = self.is_hot(self.entries.index(entry))
+                image = entry.image
+            if image is not None and entry.info.content_hash is None:
+                entry.info.content_hash = hash_image(image)
+            if hot and image is None:
+                with self.lock:
+                    if entry in self.entries:
+                        self.load(entry)
+            elif not hot and image is not None:
+                if entry.blob is None and entry.path is None and entry.mapped is None:
+                    codec, blob = encode(image)
+                    with self.lock:
+                        if entry in self.entries:
+                            entry.codec, entry.blob = codec, blob
+                with self.lock:
+                    if entry in self.entries and not self.is_hot(self.entries.index(entry)):
+                        entry.image = None
+
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        with self.lock:
+            cold_entries = [entry for index, entry in enumerate(self.entries) if not self.is_hot(index)]
+            memory_bytes = sum(entry.memory_bytes() for entry in self.entries)
+            for entry in cold_entries:
+                if memory_bytes <= self.max_bytes:
+                    break
+                if entry.path is not None or entry.mapped is not None or entry.memory_bytes() == 0:
+                    continue
+                memory_bytes -= entry.memory_bytes()
+                self.spill(entry)
+
+    def spill(self, entry):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.TemporaryDirectory(prefix='pixo_history_')
+        image = entry.image if entry.image is not None else decode(entry)
+        self.spill_count += 1
+        path = os.path.join(self.spill_dir.name, 'entry_{}.raw'.format(self.spill_count))
+        spilled_image = np.memmap(path, dtype=entry.dtype, mode='w+', shape=entry.shape)
+        spilled_image[...] = image
+        spilled_image.flush()
+        del spilled_image
+        entry.path = path
+        entry.image = None
+        entry.blob = None
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries),
+                    'raw': sum(entry.image is not None for entry in self.entries),
+                    'compressed': sum(entry.blob is not None for entry in self.entries),
+                    'spilled': sum(entry.path is not None for entry in self.entries),
+                    'mapped': sum(entry.mapped is not None for entry in self.entries),
+                    'memory_bytes': sum(entry.memory_bytes() for entry in self.entries),
+                    'max_bytes': self.max_bytes}
@@ -0,0 +1,93 @@
+import os
+import struct
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+import cv2.cv2 as cv2
+
+import Trace
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+REDUCED_READ_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+def jpeg_size(path):
+    with open(path, 'rb') as file:
+        if file.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = file.read(1)
+            while byte and byte != b'\xff':
+                byte = file.read(1)
+            while byte == b'\xff':
+                byte = file.read(1)
+            if not byte:
+                return None
+            marker = byte[0]
+            if marker in STANDALONE_MARKERS:
+                continue
+            if marker in (0xD9, 0xDA):
+                return None
+            length_bytes = file.read(2)
+            if len(length_bytes) < 2:
+                return None
+            if marker in SOF_MARKERS:
+                header = file.read(5)
+                if len(header) < 5:
+                    return None
+                _, height, width = struct.unpack('>BHH', header)
+                return width, height
+            file.seek(struct.unpack('>H', length_bytes)[0] - 2, os.SEEK_CUR)
+
+
+def reduction_for(path, target_width):
+    if os.path.splitext(path)[1].lower() not in JPEG_EXTENSIONS:
+        return 1
+    try:
+        size = jpeg_size(path)
+    except OSError:
+        return 1
+    if size is None:
+        return 1
+    for reduction in sorted(REDUCED_READ_FLAGS, reverse=True):
+        if size[0] // reduction >= target_width:
+            return reduction
+    return 1
+
+
+def read_reduced(path, reduction):
+    with Trace.span('ImageLoader.read_reduced', reduction=reduction):
+        return cv2.imread(path, REDUCED_READ_FLAGS[reduction])
+
+
+class ImageLoader(QObject):
+    image_loaded = pyqtSignal(int, str, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.lock = threading.Lock()
+        self.generation = 0
+
+    def load(self, path):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self.run, args=(generation, path), name='ImageLoader', daemon=True).start()
+        return generation
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
+    def isLatest(self, generation):
+        with self.lock:
+            return generation == self.generation
+
+    def run(self, generation, path):
+        with Trace.span('ImageLoader.read'):
+            image = cv2.imread(path)
+        if self.isLatest(generation):
+            self.image_loaded.emit(generation, path, image)
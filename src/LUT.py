@@ -0,0 +1,62 @@
+import functools
+
+import numpy as np
+import cv2.cv2 as cv2
+
+TABLE_CACHE_SIZE = 256
+
+
+def freeze(table):
+    table.setflags(write=False)
+    return table
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def contrast_and_brightness_table(alpha, beta, gamma):
+    values = np.arange(256, dtype=np.float64)
+    contrast_table = np.clip(alpha * values + beta, 0, 255).astype(np.uint8)
+    gamma_table = np.clip(np.power(values / 255.0, gamma) * 255.0, 0, 255).astype(np.uint8)
+    return freeze(gamma_table[contrast_table])
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def color_balance_table(channel, amount):  # Channel 0 = R, 1 = G, 2 = B
+    table = np.repeat(np.arange(256, dtype=np.uint8).reshape((1, 256, 1)), 3, axis=2)
+    table[0, :, 2 - channel] = np.clip(np.arange(256) + amount, 0, 255)
+    return freeze(table)
+
+
+@functools.lru_cache(maxsize=1)
+def reverse_table():
+    return freeze(255 - np.arange(256, dtype=np.uint8))
+
+
+def table_for(name, args):
+    if name == 'change_contrast_and_brightness':
+        alpha, beta, gamma = args
+        return contrast_and_brightness_table(alpha / 10, beta, gamma / 10)
+    if name == 'change_color_balance':
+        channel, amount = args
+        return color_balance_table(channel, amount)
+    if name == 'reverse_image':
+        return reverse_table()
+    raise ValueError('Not a look-up table operation: {}'.format(name))
+
+
+def per_channel(table):
+    if len(table.shape) == 3:
+        return table
+    return np.repeat(table.reshape((1, 256, 1)), 3, axis=2)
+
+
+def compose(first_table, second_table):
+    if len(first_table.shape) == 1 and len(second_table.shape) == 1:
+        return freeze(second_table[first_table])
+    first_table, second_table = per_channel(first_table), per_channel(second_table)
+    return freeze(np.take_along_axis(second_table, first_table.astype(np.intp), axis=1))
+
+
+def apply(image, table, out=None):
+    if len(image.shape) == 2 and len(table.shape) == 3:
+        table = np.ascontiguousarray(table[:, :, 0])
+    return cv2.LUT(image, table, dst=out)
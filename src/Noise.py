@@ -0,0 +1,105 @@
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+SPARSE_AMOUNT = 0.25
+
+
+def value_range(image):
+    return 255.0 if image.dtype == np.uint8 else 1.0
+
+
+def usable(out, image):
+    return out is not None and out.shape == image.shape and out.dtype == image.dtype and out.flags.c_contiguous and out.flags.writeable
+
+
+def prepare(image, out):
+    source = np.ascontiguousarray(image)
+    if not usable(out, source):
+        out = np.empty_like(source)
+    return source, out
+
+
+def chunks(source, out):
+    flat_source, flat_out = source.reshape(-1), out.reshape(-1)
+    for start in range(0, flat_source.size, CHUNK_SIZE):
+        yield flat_source[start:start + CHUNK_SIZE], flat_out[start:start + CHUNK_SIZE]
+
+
+def store(noisy_chunk, out_chunk, scale):
+    np.clip(noisy_chunk, 0, scale, out=noisy_chunk)
+    np.copyto(out_chunk, noisy_chunk, casting='unsafe')
+
+
+def gaussian(image, mean, var, seed=None, out=None):
+    rng = np.random.default_rng(seed)
+    scale = value_range(image)
+    source, out = prepare(image, out)
+    for source_chunk, out_chunk in chunks(source, out):
+        noisy_chunk = rng.standard_normal(source_chunk.shape, dtype=np.float32)
+        noisy_chunk *= np.float32(np.sqrt(var) * scale)
+        noisy_chunk += np.float32(mean * scale)
+        noisy_chunk += source_chunk
+        store(noisy_chunk, out_chunk, scale)
+    return out
+
+
+def speckle(image, mean, var, seed=None, out=None):
+    rng = np.random.default_rng(seed)
+    scale = value_range(image)
+    source, out = prepare(image, out)
+    for source_chunk, out_chunk in chunks(source, out):
+        noisy_chunk = rng.standard_normal(source_chunk.shape, dtype=np.float32)
+        noisy_chunk *= np.float32(np.sqrt(var))
+        noisy_chunk += np.float32(1 + mean)
+        noisy_chunk *= source_chunk
+        store(noisy_chunk, out_chunk, scale)
+    return out
+
+
+def poisson(image, seed=None, out=None):
+    rng = np.random.default_rng(seed)
+    scale = value_range(image)
+    source, out = prepare(image, out)
+    if source.dtype == np.uint8:
+        histogram = np.zeros(256, np.int64)
+        for source_chunk, _ in chunks(source, out):
+            histogram += np.bincount(source_chunk, minlength=256)
+        unique_count = np.count_nonzero(histogram)
+    else:
+        unique_count = len(np.unique(source))
+    levels = 2 ** np.ceil(np.log2(max(unique_count, 1)))
+    for source_chunk, out_chunk in chunks(source, out):
+        noisy_chunk = rng.poisson(source_chunk * (levels / scale)).astype(np.float32)
+        noisy_chunk *= np.float32(scale / levels)
+        store(noisy_chunk, out_chunk, scale)
+    return out
+
+
+def salt_and_pepper(image, salt_vs_pepper, amount, seed=None, out=None):
+    rng = np.random.default_rng(seed)
+    scale = value_range(image)
+    if not usable(out, image):
+        out = np.array(image, order='C')
+    elif out is not image:
+        np.copyto(out, image)
+    flat_out = out.reshape(-1)
+    size = flat_out.size
+    if size == 0 or amount <= 0:
+        return out
+
+    if amount <= SPARSE_AMOUNT:
+        draw_count = int(round(-size * np.log1p(-amount)))
+        for start in range(0, draw_count, CHUNK_SIZE):
+            count = min(CHUNK_SIZE, draw_count - start)
+            indices = rng.integers(0, size, count)
+            salted = rng.random(count, dtype=np.float32) <= salt_vs_pepper
+            flat_out[indices] = np.where(salted, scale, 0)
+        return out
+
+    for start in range(0, size, CHUNK_SIZE):
+        out_chunk = flat_out[start:start + CHUNK_SIZE]
+        flipped = rng.random(out_chunk.size, dtype=np.float32) <= amount
+        salted = rng.random(out_chunk.size, dtype=np.float32) <= salt_vs_pepper
+        out_chunk[flipped & salted] = scale
+        out_chunk[flipped & ~salted] = 0
+    return out
@@ -0,0 +1,68 @@
+import Functions
+
+OPERATIONS = {
+    'box_blur': Functions.box_blur,
+    'gaussian_blur': Functions.gaussian_blur,
+    'median_blur': Functions.median_blur,
+    'bilateral_blur': Functions.bilateral_blur,
+    'de_blur': Functions.de_blur,
+    'crop_image': Functions.crop_image,
+    'flip_image': Functions.flip_image,
+    'mirror_image': Functions.mirror_image,
+    'rotate_image': Functions.rotate_image,
+    'reverse_image': Functions.reverse_image,
+    'grayscale_image': Functions.grayscale_image,
+    'change_color_balance': Functions.change_color_balance,
+    'change_contrast_and_brightness': Functions.change_contrast_and_brightness,
+    'salt_and_pepper_noise': Functions.salt_and_pepper_noise,
+    'gaussian_noise': Functions.gaussian_noise,
+    'poisson_noise': Functions.poisson_noise,
+    'speckle_noise': Functions.speckle_noise,
+    'naive_edge_detect': Functions.naive_edge_detect,
+    'sobel_edge_detect': Functions.sobel_edge_detect,
+    'canny_edge_detect': Functions.canny_edge_detect,
+}
+
+NO_ARGS_OPERATIONS = ('de_blur', 'reverse_image', 'grayscale_image', 'poisson_noise', 'naive_edge_detect')
+
+
+def get_operation(name):
+    if name not in OPERATIONS:
+        raise ValueError('Unknown operation: {}'.format(name))
+    return OPERATIONS[name]
+
+
+def get_operation_name(function):
+    for name, operation in OPERATIONS.items():
+        if operation is function:
+            return name
+    raise ValueError('Unknown operation: {}'.format(function))
+
+
+def apply_operation(image, name, args=None):
+    operation = get_operation(name)
+    if name in NO_ARGS_OPERATIONS:
+        return operation(image)
+    return operation(image, list(args))
+
+
+def apply_operations(image, operations):
+    for name, args in operations:
+        image = apply_operation(image, name, args)
+    return image
+
+
+def parse_value(value):
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_operation(text):
+    name, _, args = text.partition(':')
+    get_operation(name)
+    args = [parse_value(arg) for arg in args.split(',') if arg.strip() != '']
+    return name, args
@@ -0,0 +1,117 @@
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import Trace
+
+
+class PreviewScheduler(QObject):
+    preview_ready = pyqtSignal(int, object)
+
+    def __init__(self, cache=None, pool=None, parent=None):
+        super().__init__(parent)
+
+        self.cache = cache
+        self.pool = pool
+        self.condition = threading.Condition()
+        self.pending = None
+        self.busy = False
+        self.running = True
+        self.generation = 0
+
+        self.submitted_count = 0
+        self.completed_count = 0
+        self.dropped_count = 0
+        self.stale_count = 0
+        self.failed_count = 0
+
+        self.thread = threading.Thread(target=self.run, name='PreviewScheduler', daemon=True)
+        self.thread.start()
+
+    def submit(self, function, image_data, args, cache_key=None, out=None):
+        with self.condition:
+            self.generation += 1
+            self.submitted_count += 1
+            if self.pending is not None:
+                self.dropped_count += 1
+                self.releaseBuffer(self.pending[5])
+            self.pending = (self.generation, function, image_data, args, cache_key, out)
+            self.condition.notify()
+            return self.generation
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            if self.pending is not None:
+                self.dropped_count += 1
+                self.releaseBuffer(self.pending[5])
+                self.pending = None
+            return self.generation
+
+    def releaseBuffer(self, buffer):
+        if buffer is not None and self.pool is not None:
+            self.pool.release(buffer)
+
+    def isLatest(self, generation):
+        with self.condition:
+            return generation == self.generation
+
+    def markStale(self):
+        with self.condition:
+            self.stale_count += 1
+
+    def queueDepth(self):
+        with self.condition:
+            return int(self.pending is not None) + int(self.busy)
+
+    def stats(self):
+        with self.condition:
+            return {'submitted': self.submitted_count,
+                    'completed': self.completed_count,
+                    'dropped': self.dropped_count,
+                    'stale': self.stale_count,
+                    'failed': self.failed_count,
+                    'queue_depth': int(self.pending is not None) + int(self.busy)}
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            if self.pending is not None:
+                self.releaseBuffer(self.pending[5])
+            self.pending = None
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation, function, image_data, args, cache_key, out = self.pending
+                self.pending = None
+                self.busy = True
+
+            try:
+                with Trace.span('PreviewScheduler.compute', function=getattr(function, 'func', function).__name__):
+                    if out is None:
+                        new_image_data = function(image_data, args)
+                    else:
+                        new_image_data = function(image_data, args, out=out)
+            except Exception:
+                new_image_data = None
+            if new_image_data is not out:
+                self.releaseBuffer(out)
+            if new_image_data is not None and self.cache is not None and cache_key is not None:
+                self.cache.put(cache_key, new_image_data)
+
+            with self.condition:
+                self.busy = False
+                if new_image_data is None:
+                    self.failed_count += 1
+                    continue
+                if generation != self.generation or not self.running:
+                    self.stale_count += 1
+                    continue
+                self.completed_count += 1
+            self.preview_ready.emit(generation, new_image_data)
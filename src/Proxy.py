@@ -0,0 +1,47 @@
+import cv2.cv2 as cv2
+
+import Functions
+
+SPATIAL_ARGS = {
+    Functions.box_blur: ('size', 'size'),
+    Functions.gaussian_blur: ('odd', 'odd', 'length'),
+    Functions.median_blur: ('odd',),
+    Functions.bilateral_blur: ('size', None, 'length'),
+    Functions.crop_image: ('position', 'position', 'position', 'position'),
+    Functions.rotate_image: (None, 'length', 'length'),
+}
+
+
+def make_proxy(image, viewport_width, viewport_height):
+    height, width = image.shape[:2]
+    if width == 0 or height == 0:
+        return image, 1.0
+    scale = max(viewport_width / width, viewport_height / height)
+    if scale >= 1.0:
+        return image, 1.0
+    new_width, new_height = max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+    proxy_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    return proxy_image, new_width / width
+
+
+def scale_arg(kind, value, scale):
+    if kind == 'size':
+        return max(int(round(value * scale)), 1)
+    if kind == 'odd':
+        value = max(int(round(value * scale)), 1)
+        return value if value % 2 == 1 else value + 1
+    if kind == 'length':
+        return value * scale
+    if kind == 'position':
+        return int(round(value * scale))
+    return value
+
+
+def scale_args(function, args, scale):
+    kinds = SPATIAL_ARGS.get(function)
+    if scale == 1.0 or kinds is None:
+        return list(args)
+    scaled_args = list(args)
+    for ind, kind in enumerate(kinds[:len(args)]):
+        scaled_args[ind] = scale_arg(kind, args[ind], scale)
+    return scaled_args
@@ -46,6 +46,13 @@ QLabel[accessibleName='start_text']
     color: #f0f0f0;
     border: 6px dashed #f0f0f0;
 }
+QLabel[accessibleName='status_text']
+{
+    font-family: 'Montserrat', Arial;
+    font-size: 14px;
+    color: #c8c8c8;
+    padding: 0px 10px;
+}
 QLabel[accessibleName='loaded_image_frame'], QLabel[accessibleName='manipulated_image_frame']
 {
     background: transparent;
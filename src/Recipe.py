@@ -0,0 +1,82 @@
+import json
+
+import Geometry
+import LUT
+import Operations
+import Proxy
+
+RECIPE_VERSION = 1
+LUT_OPERATIONS = ('change_contrast_and_brightness', 'change_color_balance', 'reverse_image')
+
+
+def fuse_steps(steps):
+    fused_steps = []
+    for name, args in steps:
+        previous_name = fused_steps[-1][0] if fused_steps else None
+        if name == 'reset':
+            fused_steps = []
+        elif name in Geometry.GEOMETRIC_OPERATIONS:
+            if previous_name != 'geometry':
+                fused_steps.append(('geometry', []))
+            fused_steps[-1][1].append((name, list(args)))
+        elif name in LUT_OPERATIONS:
+            table = LUT.table_for(name, args)
+            if previous_name == 'lut':
+                table = LUT.compose(fused_steps.pop()[1], table)
+            fused_steps.append(('lut', table))
+        else:
+            fused_steps.append((name, list(args)))
+    return fused_steps
+
+
+class Recipe:
+    def __init__(self, steps=None, width=None, height=None):
+        self.steps = [(name, list(args)) for name, args in steps or []]
+        self.width = width
+        self.height = height
+
+    def add_step(self, name, args=None):
+        if name != 'reset':
+            Operations.get_operation(name)
+        self.steps.append((name, list(args or [])))
+
+    def scaled_steps(self, image):
+        scale = 1.0 if self.width is None else image.shape[1] / self.width
+        if scale == 1.0:
+            return list(self.steps)
+        return [(name, args if name == 'reset' else Proxy.scale_args(Operations.get_operation(name), args, scale))
+                for name, args in self.steps]
+
+    def replay(self, image):
+        for name, args in fuse_steps(self.scaled_steps(image)):
+            if name == 'lut':
+                image = LUT.apply(image, args)
+            elif name == 'geometry':
+                image = Geometry.apply_steps(image, args)
+            else:
+                image = Operations.apply_operation(image, name, args)
+        return image
+
+    def to_dict(self):
+        return {'version': RECIPE_VERSION,
+                'width': self.width,
+                'height': self.height,
+                'steps': [{'operation': name, 'args': args} for name, args in self.steps]}
+
+    @staticmethod
+    def from_dict(data):
+        if data.get('version', RECIPE_VERSION) > RECIPE_VERSION:
+            raise ValueError('Unsupported recipe version: {}'.format(data['version']))
+        recipe = Recipe(width=data.get('width'), height=data.get('height'))
+        for step in data['steps']:
+            recipe.add_step(step['operation'], step.get('args'))
+        return recipe
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            return Recipe.from_dict(json.load(file))
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import Saver
+import Trace
+
+
+class SaveQueue(QObject):
+    save_started = pyqtSignal(str, int)
+    save_finished = pyqtSignal(str, float, int)
+    save_failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.condition = threading.Condition()
+        self.jobs = deque()
+        self.busy = False
+        self.running = True
+
+        self.thread = threading.Thread(target=self.run, name='SaveQueue', daemon=True)
+        self.thread.start()
+
+    def submit(self, path, image, options=None, writer=Saver.write_image):
+        with self.condition:
+            self.jobs.append((path, image, dict(options) if options is not None else None, writer))
+            self.condition.notify()
+            return len(self.jobs) + int(self.busy)
+
+    def pendingCount(self):
+        with self.condition:
+            return len(self.jobs) + int(self.busy)
+
+    def flush(self):
+        with self.condition:
+            while self.jobs or self.busy:
+                self.condition.wait()
+
+    def stop(self):
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                path, image, options, writer = self.jobs.popleft()
+                self.busy = True
+                pending = len(self.jobs)
+
+            self.save_started.emit(path, pending)
+            start_time = time.perf_counter()
+            try:
+                with Trace.span('SaveQueue.write', path=path):
+                    size = writer(path, image, options)
+            except Exception as error:
+                self.save_failed.emit(path, str(error))
+            else:
+                self.save_finished.emit(path, time.perf_counter() - start_time, size)
+
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
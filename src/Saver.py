@@ -0,0 +1,53 @@
+import os
+import stat
+import tempfile
+
+import cv2.cv2 as cv2
+
+DEFAULT_SAVE_OPTIONS = {'jpeg_quality': 95,
+                        'jpeg_progressive': False,
+                        'png_compression': 1,
+                        'webp_quality': 90}
+
+UMASK = os.umask(0o022)  # Read once at import: os.umask can only be read by setting it, which would race other threads
+os.umask(UMASK)
+
+
+def encode_params(extension, options):
+    extension = extension.lower()
+    if extension in ('.jpg', '.jpeg'):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(options['jpeg_quality']),
+                cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(options['jpeg_progressive']))]
+    if extension == '.png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(options['png_compression'])]
+    if extension == '.webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, int(options['webp_quality'])]
+    return []
+
+
+def file_mode(path):  # mkstemp creates files as 0600, so give the replacement the target's mode or the usual default
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        return 0o666 & ~UMASK
+
+
+def write_image(path, image, options=None):
+    extension = os.path.splitext(path)[1]
+    params = encode_params(extension, options) if options is not None else []
+    success, encoded_image = cv2.imencode(extension, image, params)
+    if not success:
+        raise ValueError('Could not encode image: {}'.format(path))
+
+    directory, file_name = os.path.split(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(prefix='.{}.'.format(file_name), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(encoded_image.tobytes())
+        os.chmod(temp_path, file_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return encoded_image.size
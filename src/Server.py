@@ -0,0 +1,349 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import cv2.cv2 as cv2
+
+import Operations
+import Recipe
+import Saver
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8413
+MAX_PENDING = 64
+MAX_BODY_BYTES = 256 * 1024 * 1024
+REQUEST_TIMEOUT = 30.0
+MAX_TIMEOUT = 300.0
+BATCH_SIZE = 8
+BATCH_MAX_BYTES = 256 * 1024
+LATENCY_WINDOW = 1000
+CONTENT_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp'}
+
+
+def init_worker(threads):
+    cv2.setNumThreads(threads)
+
+
+def warm_up():
+    image = np.zeros((16, 16, 3), np.uint8)
+    steps = [('gaussian_blur', [3, 3, 0]), ('canny_edge_detect', [50, 150])]
+    cv2.imencode('.png', Recipe.Recipe(steps).replay(image))
+    return os.getpid()
+
+
+def process_item(data, steps, extension, options):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)  # Same 8-bit BGR as Batch and the editor, which every operation accepts
+    if image is None:
+        raise ValueError('Could not decode image')
+    image = Recipe.Recipe(steps).replay(image)
+    success, encoded = cv2.imencode(extension, image, Saver.encode_params(extension, options))
+    if not success:
+        raise ValueError('Could not encode image as {}'.format(extension))
+    return encoded.tobytes()
+
+
+def process_batch(items):
+    results = []
+    for data, steps, extension, options in items:
+        try:
+            results.append((200, process_item(data, steps, extension, options)))
+        except (ValueError, IndexError, cv2.error) as error:
+            results.append((400, str(error)))
+        except Exception as error:
+            results.append((500, '{}: {}'.format(type(error).__name__, error)))
+    return results
+
+
+class Job:
+    def __init__(self, data, steps, extension, options, timeout):
+        self.data = data
+        self.steps = steps
+        self.extension = extension
+        self.options = options
+        self.deadline = time.monotonic() + timeout
+        self.event = threading.Event()
+        self.cancelled = False
+        self.status = None
+        self.result = None
+
+    def small(self):
+        return len(self.data) <= BATCH_MAX_BYTES
+
+    def finish(self, status, result):
+        self.status, self.result = status, result
+        self.event.set()
+
+
+class Dispatcher:
+    def __init__(self, workers=None, threads=1, max_pending=MAX_PENDING, batch_size=BATCH_SIZE):
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.max_in_flight = 2 * self.workers
+        self.threads = threads
+
+        self.condition = threading.Condition()
+        self.executor, self.worker_pids = self.start_workers()
+        self.restarts = 0
+        self.pending = deque()
+        self.in_flight = 0
+        self.running = True
+        self.start_time = time.monotonic()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.statuses = Counter()
+        self.batches = 0
+        self.batched_jobs = 0
+
+        self.thread = threading.Thread(target=self.run, name='Dispatcher', daemon=True)
+        self.thread.start()
+
+    def start_workers(self):
+        # Workers import OpenCV and run every code path once before the first request, then stay alive
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.threads,))
+        return executor, sorted(set(future.result() for future in [executor.submit(warm_up) for _ in range(self.workers)]))
+
+    def restart_workers(self):
+        broken = self.executor
+        executor, worker_pids = self.start_workers()
+        with self.condition:
+            self.executor, self.worker_pids = executor, worker_pids
+            self.restarts += 1
+        broken.shutdown(wait=False)
+
+    def submit_batch(self, items):
+        try:
+            return self.executor.submit(process_batch, items)
+        except BrokenProcessPool:  # A worker died and took the pool with it, so replace it rather than failing every later request
+            self.restart_workers()
+            return self.executor.submit(process_batch, items)
+
+    def submit(self, job):
+        with self.condition:
+            if not self.running or len(self.pending) >= self.max_pending:
+                return False
+            self.pending.append(job)
+            self.condition.notify_all()
+            return True
+
+    def next_batch(self):
+        now = time.monotonic()
+        batch = []
+        while self.pending and len(batch) < self.batch_size:
+            job = self.pending[0]
+            if job.cancelled or job.deadline <= now:
+                self.pending.popleft()
+                continue
+            if batch and not (job.small() and batch[0].small()):
+                break
+            batch.append(self.pending.popleft())
+        return batch
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.pending or self.in_flight >= self.max_in_flight):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                # Requests that queued up while the workers were busy share one task, so small images pay the IPC cost once
+                batch = self.next_batch()
+                if not batch:
+                    continue
+                self.in_flight += 1
+                self.batches += 1
+                self.batched_jobs += len(batch)
+
+            items = [(job.data, job.steps, job.extension, job.options) for job in batch]
+            try:
+                future = self.submit_batch(items)
+            except Exception as error:
+                self.finish_batch(batch, None, error)
+            else:
+                future.add_done_callback(lambda done, batch=batch: self.finish_batch(batch, done))
+
+    def finish_batch(self, batch, future, error=None):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+        try:
+            results = future.result() if error is None else None
+        except Exception as pool_error:
+            error = pool_error
+        if isinstance(error, BrokenProcessPool):
+            results = [(503, 'Worker process died, retry the request')] * len(batch)
+        elif error is not None:
+            results = [(500, '{}: {}'.format(type(error).__name__, error))] * len(batch)
+        for job, (status, result) in zip(batch, results):
+            job.finish(status, result)
+
+    def record(self, status, seconds):
+        with self.condition:
+            self.statuses[status] += 1
+            self.latencies.append(seconds * 1000)
+
+    def stats(self):
+        with self.condition:
+            latencies = np.array(self.latencies, np.float64)
+            stats = {'requests': sum(self.statuses.values()),
+                     'status': {str(status): count for status, count in sorted(self.statuses.items())},
+                     'queue_depth': len(self.pending),
+                     'max_pending': self.max_pending,
+                     'in_flight_batches': self.in_flight,
+                     'workers': self.workers,
+                     'worker_pids': self.worker_pids,
+                     'worker_restarts': self.restarts,
+                     'batches': self.batches,
+                     'mean_batch_size': self.batched_jobs / self.batches if self.batches else 0.0,
+                     'uptime_seconds': time.monotonic() - self.start_time}
+        if len(latencies) > 0:
+            p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+            stats['latency_ms'] = {'p50': p50, 'p90': p90, 'p95': p95, 'p99': p99, 'max': float(latencies.max()), 'samples': len(latencies)}
+        else:
+            stats['latency_ms'] = {'samples': 0}
+        return stats
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            pending, self.pending = list(self.pending), deque()
+            self.condition.notify_all()
+        for job in pending:
+            job.finish(503, 'Server is shutting down')
+        self.executor.shutdown(wait=True)
+
+
+def parse_request(query):
+    steps = [Operations.parse_operation(text) for text in query.get('op', [])]
+    Recipe.Recipe(steps)
+    extension = query.get('format', ['.png'])[0].lower()
+    if not extension.startswith('.'):
+        extension = '.' + extension
+    if extension not in CONTENT_TYPES:
+        raise ValueError('Unsupported format: {}'.format(extension))
+    options = dict(Saver.DEFAULT_SAVE_OPTIONS)
+    if 'quality' in query:
+        options['jpeg_quality'] = options['webp_quality'] = int(query['quality'][0])
+    timeout = float(query.get('timeout', [REQUEST_TIMEOUT])[0])
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError('Timeout must be a positive number of seconds')
+    return steps, extension, options, min(timeout, MAX_TIMEOUT)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'Pixo/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data, indent=2).encode(), 'application/json', headers)
+
+    def send_error_json(self, status, message, start_time, headers=None):
+        self.send_json(status, {'error': message}, headers)
+        self.server.dispatcher.record(status, time.perf_counter() - start_time)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/stats':
+            self.send_json(200, self.server.dispatcher.stats())
+        elif path == '/operations':
+            self.send_json(200, {'operations': sorted(Operations.OPERATIONS), 'no_args': list(Operations.NO_ARGS_OPERATIONS)})
+        else:
+            self.send_json(404, {'error': 'Not found: {}'.format(path)})
+
+    def do_POST(self):
+        start_time = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != '/process':
+            self.close_connection = True
+            return self.send_json(404, {'error': 'Not found: {}'.format(url.path)})
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.close_connection = True
+            return self.send_error_json(411, 'Content-Length is required', start_time)
+        if not length.strip().isdecimal():  # A negative length would read until the client closes the connection
+            self.close_connection = True
+            return self.send_error_json(400, 'Invalid Content-Length: {}'.format(length), start_time)
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self.send_error_json(413, 'Image is larger than {} bytes'.format(MAX_BODY_BYTES), start_time)
+        data = self.rfile.read(length)
+        if not data:
+            return self.send_error_json(400, 'Request body must contain an encoded image', start_time)
+        try:
+            steps, extension, options, timeout = parse_request(parse_qs(url.query))
+        except ValueError as error:
+            return self.send_error_json(400, str(error), start_time)
+
+        job = Job(data, steps, extension, options, timeout)
+        if not self.server.dispatcher.submit(job):
+            return self.send_error_json(503, 'Too many pending requests', start_time, {'Retry-After': '1'})
+        if not job.event.wait(timeout):
+            job.cancelled = True
+            return self.send_error_json(504, 'Request timed out after {:g}s'.format(timeout), start_time)
+        if job.status != 200:
+            return self.send_error_json(job.status, job.result, start_time, {'Retry-After': '1'} if job.status == 503 else None)
+        self.send_body(200, job.result, CONTENT_TYPES[extension])
+        self.server.dispatcher.record(200, time.perf_counter() - start_time)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, dispatcher=None, verbose=False):
+    server = ImageServer((host, port), RequestHandler)
+    server.dispatcher = dispatcher or Dispatcher()
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve Pixo operations over HTTP on the local machine.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to bind (default: localhost only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=1, help='OpenCV threads per worker')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help='queued requests before answering 503')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='small requests sent to a worker together')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    dispatcher = Dispatcher(args.workers, args.threads, args.max_pending, args.batch_size)
+    server = create_server(args.host, args.port, dispatcher, args.verbose)
+    print('Serving on http://{}:{} with {} workers'.format(args.host, server.server_address[1], dispatcher.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dispatcher.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
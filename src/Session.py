@@ -0,0 +1,119 @@
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+import History
+import Saver
+
+SESSION_VERSION = 1
+SESSION_EXTENSION = '.pixo'
+MAGIC = b'PIXOSESS'
+PAGE_SIZE = 4096
+
+
+def aligned(offset):
+    return -(-offset // PAGE_SIZE) * PAGE_SIZE
+
+
+def snapshot(history, base, index, source=None):
+    entries = history.snapshot()
+    steps, info, _ = entries[0]
+    entries[0] = (steps, info, ('raw', base))  # The base image is always stored raw so it can be mapped on reopen
+    return {'source': source, 'index': index, 'entries': entries}
+
+
+def write_session(path, state, options=None):
+    items, segments, offsets = [], [], {}
+    data_size = 0
+    for steps, info, (storage, data) in state['entries']:
+        if storage == 'raw':
+            data = np.ascontiguousarray(data)
+            key = info.content_hash or History.hash_image(data)
+            length = data.nbytes
+        else:
+            key = None
+            length = len(data)
+        if key in offsets:
+            offset = offsets[key]
+        else:
+            offset = data_size
+            segments.append((offset, data))
+            data_size = aligned(offset + length)
+            if key is not None:
+                offsets[key] = offset
+        items.append({'steps': [[name, list(args)] for name, args in steps],
+                      'shape': list(info.shape),
+                      'dtype': np.dtype(info.dtype).str,
+                      'channels_equal': bool(info.channels_equal),
+                      'content_hash': key if storage == 'raw' else info.content_hash,
+                      'storage': storage,
+                      'offset': offset,
+                      'length': length})
+
+    header = json.dumps({'version': SESSION_VERSION,
+                         'source': state.get('source'),
+                         'index': state['index'],
+                         'entries': items}).encode()
+    data_start = aligned(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(prefix='.pixo_', suffix=SESSION_EXTENSION, dir=directory)
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for offset, data in segments:
+                file.seek(data_start + offset)
+                file.write(memoryview(data).cast('B'))
+            file.truncate(data_start + data_size)
+        os.chmod(temp_path, Saver.file_mode(path))
+        try:
+            os.replace(temp_path, path)
+        except PermissionError as error:  # Windows refuses while the file is still mapped, e.g. by another open session
+            raise PermissionError('Could not replace {}, it is still in use: {}'.format(path, error)) from error
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return data_start + data_size
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a Pixo session: {}'.format(path))
+        header_length, = struct.unpack('<Q', file.read(8))
+        header = json.loads(file.read(header_length).decode())
+    if header.get('version', SESSION_VERSION) > SESSION_VERSION:
+        raise ValueError('Unsupported session version: {}'.format(header['version']))
+    return header, aligned(len(MAGIC) + 8 + header_length)
+
+
+def load_session(path):
+    header, data_start = read_header(path)
+    # One mapping holds on to this version of the file, so saving over the same path later cannot change what undo returns
+    data = np.memmap(path, dtype=np.uint8, mode='c', offset=data_start)
+    base, entries = None, []
+    for index, item in enumerate(header['entries']):
+        shape, dtype, offset = tuple(item['shape']), np.dtype(item['dtype']), item['offset']
+        segment = data[offset:offset + item['length']]
+        if len(segment) != item['length']:
+            raise ValueError('Session is truncated: {}'.format(path))
+        info = History.ImageInfo(shape, dtype, item['channels_equal'], item['content_hash'])
+        entry = History.HistoryEntry(None, [(name, args) for name, args in item['steps']], info)
+        if item['storage'] == 'raw':
+            entry.mapped = segment.view(dtype).reshape(shape)
+            if index == 0:
+                base = entry.mapped
+        else:
+            entry.codec = item['storage']
+            entry.blob = segment
+        entries.append(entry)
+    if base is None:
+        raise ValueError('Session has no base image: {}'.format(path))
+    return {'source': header.get('source'),
+            'index': min(max(header['index'], 0), len(entries) - 1),
+            'base': base,
+            'entries': entries}
@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import Blur
+import Functions
+
+DEFAULT_TILE_SIZE = 1024
+PARALLEL_TILE_SIZE = 512
+PARALLEL_MIN_PIXELS = 4 * 1024 * 1024
+
+
+def gaussian_radius(kernel_size, sigma):
+    if kernel_size <= 0:
+        kernel_size = int(round(sigma * 3 * 2 + 1)) | 1
+    return kernel_size // 2
+
+
+def box_blur_halo(args):
+    return max(args[0], args[1]) // 2
+
+
+def gaussian_blur_halo(args):
+    sigma = args[2] / 10
+    if Blur.use_box_gaussian((args[0], args[1]), sigma):
+        return Blur.box_gaussian_halo((args[0], args[1]), sigma)
+    return max(gaussian_radius(args[0], sigma), gaussian_radius(args[1], sigma))
+
+
+def median_blur_halo(args):
+    return args[0] // 2
+
+
+def bilateral_blur_halo(args):
+    if len(args) > 3 and args[3]:
+        return Blur.approximate_bilateral_halo(args[0], args[2])
+    return Blur.bilateral_radius(args[0], args[2])
+
+
+PARALLEL_OPERATIONS = (Functions.gaussian_blur, Functions.median_blur, Functions.bilateral_blur)
+
+HALOS = {
+    Functions.box_blur: box_blur_halo,
+    Functions.gaussian_blur: gaussian_blur_halo,
+    Functions.median_blur: median_blur_halo,
+    Functions.bilateral_blur: bilateral_blur_halo,
+    Functions.de_blur: lambda args: 1,
+    Functions.naive_edge_detect: lambda args: 1,
+}
+
+
+def tile_function(function, image, args=None):
+    if function is Functions.bilateral_blur and len(args) > 3 and args[3]:
+        # The error check looks at image content, so it runs once on the whole image and every tile uses the same factor
+        factor = Blur.checked_bilateral_factor(image, args[0], args[1], args[2])
+        return lambda tile, args: Blur.approximate_bilateral(tile, args[0], args[1], args[2], factor=factor)
+    return function
+
+
+def halo_for(function, args=None):
+    if function not in HALOS:
+        raise ValueError('Operation cannot be tiled: {}'.format(function.__name__))
+    return HALOS[function](args)
+
+
+def tile_rects(height, width, tile_size):
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            yield y, x, min(tile_size, height - y), min(tile_size, width - x)
+
+
+def run_tile(function, image, args, halo, rect):
+    y, x, tile_height, tile_width = rect
+    y0, x0 = max(y - halo, 0), max(x - halo, 0)
+    y1, x1 = min(y + tile_height + halo, image.shape[0]), min(x + tile_width + halo, image.shape[1])
+    tile = image[y0:y1, x0:x1]
+    result = function(tile) if args is None else function(tile, args)
+    return result[y - y0:y - y0 + tile_height, x - x0:x - x0 + tile_width]
+
+
+def allocate_output(image, result, out=None, out_path=None):
+    if out is not None:
+        return out
+    shape = image.shape[:2] + result.shape[2:]
+    if out_path is not None:
+        return np.memmap(out_path, dtype=result.dtype, mode='w+', shape=shape)
+    return np.empty(shape, result.dtype)
+
+
+def write_tile(function, image, args, halo, rect, out):
+    y, x, tile_height, tile_width = rect
+    out[y:y + tile_height, x:x + tile_width] = run_tile(function, image, args, halo, rect)
+
+
+def run_tiled(function, image, args=None, tile_size=DEFAULT_TILE_SIZE, out=None, out_path=None, workers=1):
+    halo = halo_for(function, args)
+    function = tile_function(function, image, args)
+    rects = list(tile_rects(image.shape[0], image.shape[1], tile_size))
+    if len(rects) == 0:
+        return function(image) if args is None else function(image, args)
+
+    result = run_tile(function, image, args, halo, rects[0])
+    out = allocate_output(image, result, out, out_path)
+    y, x, tile_height, tile_width = rects[0]
+    out[y:y + tile_height, x:x + tile_width] = result
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(write_tile, function, image, args, halo, rect, out) for rect in rects[1:]]
+            for future in futures:
+                future.result()
+    else:
+        for rect in rects[1:]:
+            write_tile(function, image, args, halo, rect, out)
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+def run_parallel(function, image, args=None, workers=None, tile_size=PARALLEL_TILE_SIZE):
+    if function not in PARALLEL_OPERATIONS or image.shape[0] * image.shape[1] < PARALLEL_MIN_PIXELS:
+        return function(image) if args is None else function(image, args)
+    return run_tiled(function, image, args, tile_size, workers=workers or os.cpu_count())
@@ -0,0 +1,63 @@
+import argparse
+import os
+import time
+
+import cv2.cv2 as cv2
+
+import Benchmark
+import Functions
+import Tiling
+
+BENCHMARK_OPERATIONS = [
+    ('bilateral_blur', Functions.bilateral_blur, [19, 75, 75]),
+    ('median_blur', Functions.median_blur, [49]),
+    ('gaussian_blur', Functions.gaussian_blur, [49, 49, 0]),
+]
+
+
+def best_time(callable_, repeat):
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        callable_()
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def run_benchmark(image, worker_counts, tile_sizes, repeat, opencv_threads=None):
+    rows = []
+    for name, function, args in BENCHMARK_OPERATIONS:
+        baseline = best_time(lambda: function(image, args), repeat)
+        rows.append((name, 'single call', '-', baseline, 1.0))
+        if opencv_threads is not None:
+            cv2.setNumThreads(opencv_threads)
+        for tile_size in tile_sizes:
+            for workers in worker_counts:
+                elapsed = best_time(lambda: Tiling.run_tiled(function, image, args, tile_size, workers=workers), repeat)
+                rows.append((name, '{} workers'.format(workers), tile_size, elapsed, baseline / elapsed))
+        if opencv_threads is not None:
+            cv2.setNumThreads(-1)
+    return rows
+
+
+def main(argv=None):
+    cpu_count = os.cpu_count()
+    default_workers = sorted({1, 2, 4, 8, 16, 32, cpu_count} & set(range(1, cpu_count + 1)))
+
+    parser = argparse.ArgumentParser(description='Measure how tiled filters scale with worker count.')
+    parser.add_argument('--megapixels', type=float, default=24, help='synthetic image size')
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers, help='worker counts to try')
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[Tiling.PARALLEL_TILE_SIZE], help='tile sizes to try')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    parser.add_argument('--opencv-threads', type=int, default=1, help='OpenCV threads inside each tile (-1 for default)')
+    args = parser.parse_args(argv)
+
+    image = Benchmark.synthetic_image(args.megapixels)
+    print('Image {}x{}, {} CPUs'.format(image.shape[1], image.shape[0], cpu_count))
+    print('{:<16}{:<14}{:>8}{:>12}{:>10}'.format('operation', 'mode', 'tile', 'seconds', 'speedup'))
+    for name, mode, tile_size, elapsed, speedup in run_benchmark(image, args.workers, args.tile_sizes, args.repeat, args.opencv_threads):
+        print('{:<16}{:<14}{:>8}{:>12.3f}{:>9.2f}x'.format(name, mode, tile_size, elapsed, speedup))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get('PIXO_TRACE', '0') not in ('', '0')
+TRACE_PATH = os.environ.get('PIXO_TRACE_FILE', 'pixo_trace.json')
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+MAX_EVENTS = 1000000
+
+events = []
+histograms = {}
+lock = threading.Lock()
+origin_ns = time.perf_counter_ns()
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ('name', 'args', 'start_ns')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, self.start_ns, time.perf_counter_ns(), self.args)
+        return False
+
+
+def span(name, **args):
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def traced(name):
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bucket_index(duration_ms):
+    for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+        if duration_ms <= bound:
+            return index
+    return len(HISTOGRAM_BUCKETS_MS)
+
+
+def record(name, start_ns, end_ns, args=None):
+    duration_ms = (end_ns - start_ns) / 1000000
+    event = {'name': name,
+             'ph': 'X',
+             'ts': (start_ns - origin_ns) / 1000,
+             'dur': (end_ns - start_ns) / 1000,
+             'pid': os.getpid(),
+             'tid': threading.get_ident()}
+    if args:
+        event['args'] = args
+    with lock:
+        if len(events) < MAX_EVENTS:
+            events.append(event)
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)}
+        histogram['count'] += 1
+        histogram['total_ms'] += duration_ms
+        histogram['max_ms'] = max(histogram['max_ms'], duration_ms)
+        histogram['buckets'][bucket_index(duration_ms)] += 1
+
+
+def percentile(histogram, fraction):
+    target = histogram['count'] * fraction
+    seen = 0
+    for index, count in enumerate(histogram['buckets']):
+        seen += count
+        if seen >= target and count > 0:
+            return HISTOGRAM_BUCKETS_MS[index] if index < len(HISTOGRAM_BUCKETS_MS) else histogram['max_ms']
+    return histogram['max_ms']
+
+
+def summary():
+    lines = ['{:<44}{:>8}{:>12}{:>12}{:>12}{:>12}'.format('span', 'count', 'mean ms', 'p50 <= ms', 'p95 <= ms', 'max ms')]
+    with lock:
+        items = sorted(histograms.items(), key=lambda item: -item[1]['total_ms'])
+        for name, histogram in items:
+            lines.append('{:<44}{:>8}{:>12.3f}{:>12}{:>12}{:>12.3f}'.format(
+                name, histogram['count'], histogram['total_ms'] / histogram['count'],
+                percentile(histogram, 0.5), percentile(histogram, 0.95), histogram['max_ms']))
+    return '\n'.join(lines)
+
+
+def export(path=TRACE_PATH):
+    with lock:
+        trace = {'traceEvents': list(events),
+                 'displayTimeUnit': 'ms',
+                 'otherData': {'histogram_buckets_ms': HISTOGRAM_BUCKETS_MS, 'histograms': dict(histograms)}}
+    with open(path, 'w') as file:
+        json.dump(trace, file)
+    return path
+
+
+def reset():
+    with lock:
+        events.clear()
+        histograms.clear()
+
+
+def export_at_exit():
+    if histograms:
+        print(summary(), file=sys.stderr)
+        print('Trace written to {}'.format(export()), file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(export_at_exit)
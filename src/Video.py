@@ -0,0 +1,330 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2.cv2 as cv2
+
+import Operations
+import Recipe
+import Saver
+import Trace
+
+QUEUE_SIZE = 8
+DEFAULT_FPS = 25.0
+POLL_SECONDS = 0.1
+FOURCCS = {'.avi': 'MJPG', '.mp4': 'mp4v', '.m4v': 'mp4v', '.mov': 'mp4v', '.mkv': 'XVID'}
+END = None
+
+
+def is_sequence(path):  # Numbered frame sequences use printf patterns, e.g. frames/frame_%04d.png
+    return '%' in path
+
+
+def open_capture(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('Could not open video: {}'.format(path))
+    return capture
+
+
+def fourcc_for(path, fourcc=None):
+    code = fourcc or FOURCCS.get(os.path.splitext(path)[1].lower())
+    if code is None:
+        raise ValueError('No codec known for {}, pass a fourcc'.format(path))
+    return cv2.VideoWriter_fourcc(*code)
+
+
+def as_color(frame):
+    if len(frame.shape) == 2:
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    return frame
+
+
+class PreviewTap:
+    def __init__(self, every=1):
+        self.every = max(every, 1)
+        self.lock = threading.Lock()
+        self.index = None
+        self.frame = None
+
+    def put(self, index, frame):
+        if index % self.every == 0:
+            with self.lock:
+                self.index, self.frame = index, frame
+
+    def latest(self):
+        with self.lock:
+            return self.index, self.frame
+
+
+class VideoPipeline:
+    def __init__(self, input_path, output_path, recipe, step=1, max_frames=None, workers=1, queue_size=QUEUE_SIZE,
+                 drop_late=False, fps=None, fourcc=None, preview=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.recipe = recipe
+        self.step = max(step, 1)
+        self.max_frames = max_frames
+        self.workers = max(workers, 1)
+        self.drop_late = drop_late
+        self.fourcc = fourcc
+        self.preview = preview
+
+        self.capture = open_capture(input_path)
+        input_fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps or (input_fps / self.step if input_fps > 0 else DEFAULT_FPS)
+        self.total_frames = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # Frames in flight hold a slot from decode until encode, which keeps memory constant whatever the clip length
+        self.slots = threading.Semaphore(queue_size)
+        self.frames = queue.Queue(maxsize=queue_size + self.workers)
+        self.results = queue.Queue(maxsize=queue_size + self.workers)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.error = None
+        self.threads = []
+        self.start_time = None
+        self.end_time = None
+        self.counts = {'read': 0, 'skipped': 0, 'dropped': 0, 'processed': 0, 'written': 0}
+        self.seconds = {'decode': 0.0, 'process': 0.0, 'encode': 0.0}
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.threads = [threading.Thread(target=self.guard, args=(self.read,), name='VideoRead', daemon=True),
+                        threading.Thread(target=self.guard, args=(self.write,), name='VideoWrite', daemon=True)]
+        self.threads += [threading.Thread(target=self.guard, args=(self.process,), name='VideoProcess', daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def guard(self, target):
+        try:
+            target()
+        except Exception as error:
+            with self.lock:
+                if self.error is None:
+                    self.error = error
+            self.stop_event.set()
+
+    def count(self, name, amount=1, stage=None, seconds=0.0):
+        with self.lock:
+            self.counts[name] += amount
+            if stage is not None:
+                self.seconds[stage] += seconds
+
+    def put(self, target_queue, item):
+        while not self.stop_event.is_set():
+            try:
+                target_queue.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, source_queue):
+        while not self.stop_event.is_set():
+            try:
+                return True, source_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return False, None
+
+    def acquire_slot(self):
+        if self.drop_late:
+            return self.slots.acquire(blocking=False)
+        while not self.stop_event.is_set():
+            if self.slots.acquire(timeout=POLL_SECONDS):
+                return True
+        return False
+
+    def read(self):
+        frame_index, sequence = 0, 0
+        try:
+            while not self.stop_event.is_set() and (self.max_frames is None or sequence < self.max_frames):
+                if frame_index % self.step != 0:
+                    if not self.capture.grab():
+                        break
+                    self.count('skipped')
+                    frame_index += 1
+                    continue
+                if not self.acquire_slot():
+                    if self.stop_event.is_set() or not self.capture.grab():
+                        break
+                    self.count('dropped')
+                    frame_index += 1
+                    continue
+
+                start_time = time.perf_counter()
+                success, frame = self.capture.read()
+                if not success:
+                    self.slots.release()
+                    break
+                self.count('read', stage='decode', seconds=time.perf_counter() - start_time)
+                if not self.put(self.frames, (sequence, frame)):
+                    break
+                frame_index += 1
+                sequence += 1
+        finally:
+            self.capture.release()
+            for _ in range(self.workers):
+                self.put(self.frames, END)
+
+    def process(self):
+        while True:
+            success, item = self.get(self.frames)
+            if not success:
+                return
+            if item is END:
+                self.put(self.results, END)
+                return
+            sequence, frame = item
+            start_time = time.perf_counter()
+            with Trace.span('Video.process', frame=sequence):
+                frame = self.recipe.replay(frame)
+            self.count('processed', stage='process', seconds=time.perf_counter() - start_time)
+            if not self.put(self.results, (sequence, frame)):
+                return
+
+    def write(self):
+        writer, frame_size = None, None
+        pending, next_sequence, finished_workers = {}, 0, 0
+        try:
+            while finished_workers < self.workers or pending:
+                if next_sequence not in pending:
+                    if finished_workers == self.workers:
+                        raise RuntimeError('Frame {} was never processed'.format(next_sequence))
+                    success, item = self.get(self.results)
+                    if not success:
+                        return
+                    if item is END:
+                        finished_workers += 1
+                    else:
+                        pending[item[0]] = item[1]
+                    continue
+
+                frame = pending.pop(next_sequence)
+                start_time = time.perf_counter()
+                if is_sequence(self.output_path):
+                    Saver.write_image(self.output_path % next_sequence, frame)
+                else:
+                    frame = as_color(frame)
+                    if writer is None:
+                        frame_size = (frame.shape[1], frame.shape[0])
+                        writer = cv2.VideoWriter(self.output_path, fourcc_for(self.output_path, self.fourcc), self.fps, frame_size)
+                        if not writer.isOpened():
+                            raise ValueError('Could not open video for writing: {}'.format(self.output_path))
+                    if (frame.shape[1], frame.shape[0]) != frame_size:
+                        raise ValueError('Frame {} is {}x{}, expected {}x{}'.format(next_sequence, frame.shape[1], frame.shape[0], *frame_size))
+                    writer.write(frame)
+                self.count('written', stage='encode', seconds=time.perf_counter() - start_time)
+                if self.preview is not None:
+                    self.preview.put(next_sequence, frame)
+                self.slots.release()
+                next_sequence += 1
+        finally:
+            if writer is not None:
+                writer.release()
+            self.end_time = time.perf_counter()
+
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def wait(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            counts, seconds = dict(self.counts), dict(self.seconds)
+        end_time = self.end_time or time.perf_counter()
+        elapsed = end_time - self.start_time if self.start_time is not None else 0.0
+        stats = dict(counts)
+        stats.update({'total_frames': self.total_frames,
+                      'seconds': elapsed,
+                      'fps': counts['written'] / elapsed if elapsed > 0 else 0.0,
+                      'queued': self.frames.qsize(),
+                      'finished': self.results.qsize()})
+        for stage, stage_seconds in seconds.items():
+            stage_count = counts['read' if stage == 'decode' else 'processed' if stage == 'process' else 'written']
+            stats[stage + '_ms'] = stage_seconds * 1000 / stage_count if stage_count else 0.0
+        return stats
+
+
+def run_video(input_path, output_path, recipe, **options):
+    pipeline = VideoPipeline(input_path, output_path, recipe, **options)
+    pipeline.start()
+    return pipeline.wait()
+
+
+def print_progress(stats, file=sys.stdout, end='\r'):
+    total = '/{}'.format(stats['total_frames']) if stats['total_frames'] > 0 else ''
+    print('{}{} frames, {:.1f} fps (decode {:.1f} ms, process {:.1f} ms, encode {:.1f} ms per frame, {} skipped, {} dropped)'.format(
+        stats['written'], total, stats['fps'], stats['decode_ms'], stats['process_ms'], stats['encode_ms'],
+        stats['skipped'], stats['dropped']), file=file, end=end, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply a chain of Pixo operations to a video or numbered frame sequence.')
+    parser.add_argument('input', help='video file or frame pattern such as frames/frame_%%04d.png')
+    parser.add_argument('-o', '--output', required=True, help='output video file or frame pattern')
+    steps = parser.add_mutually_exclusive_group(required=True)
+    steps.add_argument('--op', dest='operations', action='append', default=[], type=Operations.parse_operation,
+                       help='operation as name:arg1,arg2,... (repeatable, applied in order)')
+    steps.add_argument('--recipe', default=None, help='recipe file exported from the editor')
+    parser.add_argument('--step', type=int, default=1, help='process every Nth frame')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop after this many output frames')
+    parser.add_argument('--drop-late', action='store_true', help='drop frames instead of waiting when processing falls behind')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='frames processed in parallel')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='frames in flight between decode and encode')
+    parser.add_argument('--fps', type=float, default=None, help='output frame rate (default: input rate divided by --step)')
+    parser.add_argument('--fourcc', default=None, help='output codec, e.g. mp4v or MJPG')
+    parser.add_argument('--preview', default=None, help='image file kept updated with the latest processed frame')
+    parser.add_argument('--preview-every', type=int, default=30, help='frames between preview updates')
+    args = parser.parse_args(argv)
+
+    recipe = Recipe.Recipe.load(args.recipe) if args.recipe else Recipe.Recipe(args.operations)
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    preview = PreviewTap(args.preview_every) if args.preview else None
+    pipeline, preview_index = None, None
+    try:
+        pipeline = VideoPipeline(args.input, args.output, recipe, step=args.step, max_frames=args.max_frames, workers=args.workers,
+                                 queue_size=args.queue_size, drop_late=args.drop_late, fps=args.fps, fourcc=args.fourcc, preview=preview)
+        pipeline.start()
+        while pipeline.running():
+            time.sleep(0.5)
+            print_progress(pipeline.stats())
+            if preview is not None:
+                index, frame = preview.latest()
+                if index is not None and index != preview_index:
+                    Saver.write_image(args.preview, frame)
+                    preview_index = index
+        stats = pipeline.wait()
+    except KeyboardInterrupt:
+        if pipeline is None:
+            return 1
+        pipeline.stop()
+        stats = pipeline.stats()
+    except Exception as error:
+        print(file=sys.stderr)
+        print('Failed: {}'.format(error), file=sys.stderr)
+        return 1
+    print_progress(stats, end='\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
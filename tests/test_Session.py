@@ -0,0 +1,129 @@
+import gc
+import os
+import stat
+import sys
+import tempfile
+import unittest
+import weakref
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import History
+import Saver
+import Session
+
+
+def make_image(seed, size=64):
+    return np.random.RandomState(seed).randint(0, 256, (size, size, 3), np.uint8)
+
+
+def make_history(count):
+    base = make_image(0)
+    history = History.ImageHistory()
+    history.reset(base)
+    images = [base]
+    for index in range(1, count):
+        images.append(make_image(index))
+        history.push(index, images[-1], [('gaussian_blur', [3, 3, index])])
+    return history, base, images
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'edit' + Session.SESSION_EXTENSION)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def reopen(self):
+        session = Session.load_session(self.path)
+        history = History.ImageHistory()
+        history.restore(session['entries'], session['index'])
+        return session, history
+
+    def test_round_trip(self):
+        history, base, images = make_history(4)
+        Session.write_session(self.path, Session.snapshot(history, base, 2, 'source.png'))
+        session, reopened = self.reopen()
+        self.assertEqual(session['index'], 2)
+        self.assertEqual(session['source'], 'source.png')
+        self.assertTrue(np.array_equal(session['base'], base))
+        for index, image in enumerate(images):
+            self.assertTrue(np.array_equal(reopened[index], image))
+        self.assertEqual(reopened.recorded_steps(3), history.recorded_steps(3))
+
+    def test_same_bytes_different_shapes(self):
+        color = make_image(1, 100)
+        history = History.ImageHistory()
+        history.reset(color)
+        history.push(1, color.reshape(100, 300), [('grayscale_image', [])])
+        history.push(2, color.reshape(300, 100, 1), [('grayscale_image', [])])
+        self.assertEqual(len({history.content_hash(index) for index in range(3)}), 3)
+        Session.write_session(self.path, Session.snapshot(history, color, 2))
+        _, reopened = self.reopen()
+        self.assertEqual([reopened[index].shape for index in range(3)], [(100, 100, 3), (100, 300), (300, 100, 1)])
+
+    def test_undo_after_resaving_over_same_path(self):
+        history, base, images = make_history(3)
+        Session.write_session(self.path, Session.snapshot(history, base, 2))
+        session, reopened = self.reopen()
+
+        # Enough new states to push the header past a page, which moves every image in the new file
+        for index in range(3, 40):
+            images.append(make_image(index))
+            reopened.push(index, images[-1], [('gaussian_blur', [3, 3, index])])
+        Session.write_session(self.path, Session.snapshot(reopened, session['base'], len(images) - 1))
+        _, data_start = Session.read_header(self.path)
+        self.assertGreater(data_start, Session.PAGE_SIZE)
+        for index, image in enumerate(images):
+            self.assertTrue(np.array_equal(reopened[index], image))
+
+        # A shorter file over the same path must not break states that were mapped from the old one
+        session, reopened = self.reopen()
+        small_history, small_base, _ = make_history(1)
+        Session.write_session(self.path, Session.snapshot(small_history, small_base, 0))
+        for index in range(len(images) - 1, -1, -1):
+            self.assertTrue(np.array_equal(reopened[index], images[index]))
+
+    def test_detach_releases_the_mapping(self):
+        # Windows cannot replace a mapped file, so nothing may still map it once the history lets go
+        history, base, images = make_history(5)
+        Session.write_session(self.path, Session.snapshot(history, base, 4))
+        session, reopened = self.reopen()
+        reopened[2]
+        mapping = weakref.ref(session['base']._mmap)
+        del session
+        reopened.detach_file(self.path)
+        gc.collect()
+        self.assertIsNone(mapping())
+        for index, image in enumerate(images):
+            self.assertTrue(np.array_equal(reopened[index], image))
+
+    def test_replace_refused(self):
+        history, base, _ = make_history(2)
+        with mock.patch('os.replace', side_effect=PermissionError(13, 'Access is denied')):
+            with self.assertRaises(PermissionError):
+                Session.write_session(self.path, Session.snapshot(history, base, 1))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_permissions(self):
+        history, base, _ = make_history(2)
+        Session.write_session(self.path, Session.snapshot(history, base, 1))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o666 & ~Saver.UMASK)
+        os.chmod(self.path, 0o640)
+        Session.write_session(self.path, Session.snapshot(history, base, 0))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a session')
+        with self.assertRaises(ValueError):
+            Session.load_session(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()